@@ -29,10 +29,20 @@ __docformat__ = 'restructuredtext'
 __version__ = '$Id: euclid.py 31 2009-02-14 16:04:05Z swiftcoder $'
 __revision__ = '$Revision: 31 $'
 
+import array
+import bisect
+import heapq
 import math
 import operator
 import types
 
+# Vector2Array keeps its coordinates in a numpy array when numpy is
+# installed and in an array('d') otherwise.
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 # Some magic here.  If _use_slots is True, the classes will derive from
 # object and will define a __slots__ class variable.  If _use_slots is
 # False, classes will be old-style and will not define __slots__.
@@ -57,8 +67,11 @@ if _enable_swizzle_set:
 class _EuclidMetaclass(type):
     def __new__(cls, name, bases, dct):
         if '__slots__' in dct:
-            dct['__getstate__'] = cls._create_getstate(dct['__slots__'])
-            dct['__setstate__'] = cls._create_setstate(dct['__slots__'])
+            slots = cls._get_inherited_slots(bases) + list(dct['__slots__'])
+            if '__getstate__' not in dct:
+                dct['__getstate__'] = cls._create_getstate(slots)
+            if '__setstate__' not in dct:
+                dct['__setstate__'] = cls._create_setstate(slots)
         if _use_slots:
             return type.__new__(cls, name, bases + (object,), dct)
         else:
@@ -66,19 +79,36 @@ class _EuclidMetaclass(type):
                 del dct['__slots__']
             return types.ClassType.__new__(types.ClassType, name, bases, dct)
 
+    @classmethod
+    def _get_inherited_slots(cls, bases):
+        # Subclasses declare only their own slots, often none.
+        slots = []
+        for base in bases:
+            for klass in reversed(getattr(base, '__mro__', (base,))):
+                for slot in klass.__dict__.get('__slots__', ()):
+                    if slot not in slots:
+                        slots.append(slot)
+        return slots
+
+    # The state is a tuple of slot values in slot order, which pickles much
+    # smaller than a dict keyed by slot name.  Dict states written by older
+    # versions are still accepted.
     @classmethod
     def _create_getstate(cls, slots):
+        slots = tuple(slots)
         def __getstate__(self):
-            d = {}
-            for slot in slots:
-                d[slot] = getattr(self, slot)
-            return d
+            return tuple([getattr(self, slot) for slot in slots])
         return __getstate__
 
     @classmethod
     def _create_setstate(cls, slots):
+        slots = tuple(slots)
         def __setstate__(self, state):
-            for name, value in state.items():
+            if isinstance(state, dict):
+                state = state.items()
+            else:
+                state = zip(slots, state)
+            for name, value in state:
                 setattr(self, name, value)
         return __setstate__
 
@@ -161,6 +191,8 @@ class Vector2:
                 _class = Point2
             return _class(self.x + other.x,
                           self.y + other.y)
+        elif isinstance(other, Vector2Array):
+            return NotImplemented
         else:
             assert hasattr(other, '__len__') and len(other) == 2
             return Vector2(self.x + other[0],
@@ -187,6 +219,8 @@ class Vector2:
                 _class = Point2
             return _class(self.x - other.x,
                           self.y - other.y)
+        elif isinstance(other, Vector2Array):
+            return NotImplemented
         else:
             assert hasattr(other, '__len__') and len(other) == 2
             return Vector2(self.x - other[0],
@@ -293,6 +327,50 @@ class Vector2:
         return Vector2(self.x - d * normal.x,
                        self.y - d * normal.y)
 
+    # In-place and fused operations.  These write their result into self or
+    # into a caller-supplied vector, so that inner loops can reuse scratch
+    # vectors instead of allocating temporaries.
+
+    def set_from(self, other):
+        if isinstance(other, Vector2):
+            self.x = other.x
+            self.y = other.y
+        else:
+            self.x, self.y = other
+        return self
+
+    def add_scaled(self, other, scale):
+        # self += other * scale
+        assert isinstance(other, Vector2)
+        self.x += other.x * scale
+        self.y += other.y * scale
+        return self
+
+    def sub_into(self, other, out):
+        # out = self - other
+        assert isinstance(other, Vector2) and isinstance(out, Vector2)
+        out.x = self.x - other.x
+        out.y = self.y - other.y
+        return out
+
+    def lerp_into(self, other, t, out):
+        # out = self + (other - self) * t
+        assert isinstance(other, Vector2) and isinstance(out, Vector2)
+        out.x = self.x + (other.x - self.x) * t
+        out.y = self.y + (other.y - self.y) * t
+        return out
+
+    def normalize_into(self, out):
+        assert isinstance(out, Vector2)
+        d = math.sqrt(self.x ** 2 + self.y ** 2)
+        if d:
+            out.x = self.x / d
+            out.y = self.y / d
+        else:
+            out.x = self.x
+            out.y = self.y
+        return out
+
 class Vector3:
     __slots__ = ['x', 'y', 'z']
 
@@ -544,6 +622,309 @@ class Vector3:
                        self.y - d * normal.y,
                        self.z - d * normal.z)
 
+    # In-place and fused operations, as for Vector2.
+
+    def set_from(self, other):
+        if isinstance(other, Vector3):
+            self.x = other.x
+            self.y = other.y
+            self.z = other.z
+        else:
+            self.x, self.y, self.z = other
+        return self
+
+    def add_scaled(self, other, scale):
+        # self += other * scale
+        assert isinstance(other, Vector3)
+        self.x += other.x * scale
+        self.y += other.y * scale
+        self.z += other.z * scale
+        return self
+
+    def sub_into(self, other, out):
+        # out = self - other
+        assert isinstance(other, Vector3) and isinstance(out, Vector3)
+        out.x = self.x - other.x
+        out.y = self.y - other.y
+        out.z = self.z - other.z
+        return out
+
+    def lerp_into(self, other, t, out):
+        # out = self + (other - self) * t
+        assert isinstance(other, Vector3) and isinstance(out, Vector3)
+        out.x = self.x + (other.x - self.x) * t
+        out.y = self.y + (other.y - self.y) * t
+        out.z = self.z + (other.z - self.z) * t
+        return out
+
+    def normalize_into(self, out):
+        assert isinstance(out, Vector3)
+        d = math.sqrt(self.x ** 2 + self.y ** 2 + self.z ** 2)
+        if d:
+            out.x = self.x / d
+            out.y = self.y / d
+            out.z = self.z / d
+        else:
+            out.x = self.x
+            out.y = self.y
+            out.z = self.z
+        return out
+
+# Arrays of vectors
+# ---------------------------------------------------------------------------
+# Coordinates are stored interleaved in a flat buffer: x0, y0, x1, y1, ...
+
+def _new_buffer(size):
+    if numpy is not None:
+        return numpy.zeros(size)
+    return array.array('d', [0.]) * size
+
+def _as_buffer(values, copy=True):
+    if numpy is not None:
+        if isinstance(values, array.array):
+            values = numpy.frombuffer(values, dtype=float)
+        if isinstance(values, numpy.ndarray):
+            values = values.astype(float, copy=False).ravel()
+            if copy:
+                values = values.copy()
+            return values
+        return numpy.array(list(values), dtype=float)
+    if isinstance(values, array.array) and values.typecode == 'd' and \
+       not copy:
+        return values
+    return array.array('d', values)
+
+def _as_numpy(values):
+    # Views array('d') buffers without copying.
+    if isinstance(values, array.array) and values.typecode == 'd':
+        return numpy.frombuffer(values, dtype=float)
+    return numpy.asarray(values, dtype=float)
+
+def _numpy_buffers(*buffers):
+    # True if numpy can operate on all buffers in place.
+    if numpy is None:
+        return False
+    for buffer in buffers:
+        if not isinstance(buffer, numpy.ndarray) and \
+           not (isinstance(buffer, array.array) and buffer.typecode == 'd'):
+            return False
+    return True
+
+def _new_buffer_like(src):
+    if numpy is not None and isinstance(src, numpy.ndarray):
+        return numpy.empty(src.shape)
+    return array.array('d', [0.]) * len(src)
+
+def _flatten2(vectors):
+    coords = []
+    for v in vectors:
+        coords.append(v[0])
+        coords.append(v[1])
+    return coords
+
+class Vector2Array:
+    __slots__ = ['data']
+
+    def __init__(self, vectors=()):
+        if isinstance(vectors, Vector2Array):
+            self.data = _as_buffer(vectors.data)
+        else:
+            self.data = _as_buffer(_flatten2(vectors))
+
+    def __copy__(self):
+        return self.__class__.new_from_buffer(self.data)
+
+    copy = __copy__
+
+    def __repr__(self):
+        return 'Vector2Array([%s])' % ', '.join(['(%.2f, %.2f)' % tuple(v)
+                                                for v in self])
+
+    def __len__(self):
+        return len(self.data) // 2
+
+    def __getitem__(self, key):
+        if key < 0:
+            key += len(self)
+        if not 0 <= key < len(self):
+            raise IndexError, key
+        return Vector2(self.data[2 * key], self.data[2 * key + 1])
+
+    def __setitem__(self, key, value):
+        if key < 0:
+            key += len(self)
+        if not 0 <= key < len(self):
+            raise IndexError, key
+        self.data[2 * key] = value[0]
+        self.data[2 * key + 1] = value[1]
+
+    def __iter__(self):
+        data = self.data
+        for i in xrange(0, len(data), 2):
+            yield Vector2(data[i], data[i + 1])
+
+    def _get_xs(self):
+        return self.data[0::2]
+
+    xs = property(_get_xs)
+
+    def _get_ys(self):
+        return self.data[1::2]
+
+    ys = property(_get_ys)
+
+    def get_vectors(self):
+        data = self.data
+        return [Vector2(data[i], data[i + 1])
+                for i in xrange(0, len(data), 2)]
+
+    def get_points(self):
+        data = self.data
+        return [Point2(data[i], data[i + 1])
+                for i in xrange(0, len(data), 2)]
+
+    def _other_data(self, other):
+        # Returns a flat buffer with the same length as self.data, repeating
+        # other if it is a single vector.
+        if isinstance(other, Vector2Array):
+            assert len(other) == len(self)
+            return other.data
+        assert hasattr(other, '__len__') and len(other) == 2
+        if numpy is not None:
+            return numpy.tile(numpy.array((other[0], other[1]), dtype=float),
+                              len(self))
+        return (other[0], other[1]) * len(self)
+
+    def __add__(self, other):
+        other = self._other_data(other)
+        if numpy is not None:
+            return Vector2Array.new_from_buffer(self.data + other, False)
+        return Vector2Array.new_from_buffer(map(operator.add, self.data,
+                                                other), False)
+    __radd__ = __add__
+
+    def __iadd__(self, other):
+        other = self._other_data(other)
+        if numpy is not None:
+            self.data += other
+        else:
+            self.data = array.array('d', map(operator.add, self.data, other))
+        return self
+
+    def __sub__(self, other):
+        other = self._other_data(other)
+        if numpy is not None:
+            return Vector2Array.new_from_buffer(self.data - other, False)
+        return Vector2Array.new_from_buffer(map(operator.sub, self.data,
+                                                other), False)
+
+    def __rsub__(self, other):
+        other = self._other_data(other)
+        if numpy is not None:
+            return Vector2Array.new_from_buffer(other - self.data, False)
+        return Vector2Array.new_from_buffer(map(operator.sub, other,
+                                                self.data), False)
+
+    def __isub__(self, other):
+        other = self._other_data(other)
+        if numpy is not None:
+            self.data -= other
+        else:
+            self.data = array.array('d', map(operator.sub, self.data, other))
+        return self
+
+    def __mul__(self, other):
+        assert type(other) in (int, long, float)
+        if numpy is not None:
+            return Vector2Array.new_from_buffer(self.data * other, False)
+        return Vector2Array.new_from_buffer([c * other for c in self.data],
+                                            False)
+
+    __rmul__ = __mul__
+
+    def __imul__(self, other):
+        assert type(other) in (int, long, float)
+        if numpy is not None:
+            self.data *= other
+        else:
+            self.data = array.array('d', [c * other for c in self.data])
+        return self
+
+    def __div__(self, other):
+        assert type(other) in (int, long, float)
+        return self * (1. / other)
+
+    __truediv__ = __div__
+
+    def __neg__(self):
+        return self * -1.
+
+    __pos__ = __copy__
+
+    def __abs__(self):
+        if numpy is not None:
+            return numpy.hypot(self.data[0::2], self.data[1::2])
+        return array.array('d', map(math.hypot, self.data[0::2],
+                                    self.data[1::2]))
+
+    magnitude = __abs__
+
+    def magnitude_squared(self):
+        return self.dot(self)
+
+    def normalize(self):
+        # Zero vectors are left unchanged, as in Vector2.normalize.
+        d = self.magnitude()
+        if numpy is not None:
+            d[d == 0] = 1.
+            self.data.reshape(-1, 2)[:] /= d[:, numpy.newaxis]
+        else:
+            data = self.data
+            for i, m in enumerate(d):
+                if m:
+                    data[2 * i] /= m
+                    data[2 * i + 1] /= m
+        return self
+
+    def normalized(self):
+        return self.copy().normalize()
+
+    def dot(self, other):
+        other = self._other_data(other)
+        data = self.data
+        if numpy is not None:
+            return data[0::2] * other[0::2] + data[1::2] * other[1::2]
+        return array.array('d', map(operator.add,
+                                    map(operator.mul, data[0::2],
+                                        other[0::2]),
+                                    map(operator.mul, data[1::2],
+                                        other[1::2])))
+
+    def cross(self):
+        # Perpendicular vectors, as in Vector2.cross.
+        V = Vector2Array.new_zeros(len(self))
+        V.data[0::2] = self.data[1::2]
+        if numpy is not None:
+            V.data[1::2] = -self.data[0::2]
+        else:
+            V.data[1::2] = array.array('d', [-x for x in self.data[0::2]])
+        return V
+
+    # Static constructors
+    def new_zeros(cls, size):
+        self = cls.__new__(cls)
+        self.data = _new_buffer(2 * size)
+        return self
+    new_zeros = classmethod(new_zeros)
+
+    def new_from_buffer(cls, data, copy=True):
+        self = cls.__new__(cls)
+        self.data = _as_buffer(data, copy)
+        assert len(self.data) % 2 == 0
+        return self
+    new_from_buffer = classmethod(new_from_buffer)
+
+
 # a b c 
 # e f g 
 # i j k 
@@ -672,6 +1053,82 @@ class Matrix3:
         self.k = Ai * Bc + Aj * Bg + Ak * Bk
         return self
 
+    def compose_into(self, other, out):
+        # out = self * other.  out may be self or other.
+        assert isinstance(other, Matrix3) and isinstance(out, Matrix3)
+        # Cache attributes in local vars (see Matrix3.__mul__).
+        Aa = self.a
+        Ab = self.b
+        Ac = self.c
+        Ae = self.e
+        Af = self.f
+        Ag = self.g
+        Ai = self.i
+        Aj = self.j
+        Ak = self.k
+        Ba = other.a
+        Bb = other.b
+        Bc = other.c
+        Be = other.e
+        Bf = other.f
+        Bg = other.g
+        Bi = other.i
+        Bj = other.j
+        Bk = other.k
+        out.a = Aa * Ba + Ab * Be + Ac * Bi
+        out.b = Aa * Bb + Ab * Bf + Ac * Bj
+        out.c = Aa * Bc + Ab * Bg + Ac * Bk
+        out.e = Ae * Ba + Af * Be + Ag * Bi
+        out.f = Ae * Bb + Af * Bf + Ag * Bj
+        out.g = Ae * Bc + Af * Bg + Ag * Bk
+        out.i = Ai * Ba + Aj * Be + Ak * Bi
+        out.j = Ai * Bb + Aj * Bf + Ak * Bj
+        out.k = Ai * Bc + Aj * Bg + Ak * Bk
+        return out
+
+    def transform_points(self, src, dst=None):
+        # Transforms a flat buffer (or an N x 2 numpy array) of points in
+        # one call, writing the result to dst.  dst may be src.
+        if dst is None:
+            dst = _new_buffer_like(src)
+        a, b, c = self.a, self.b, self.c
+        e, f, g = self.e, self.f, self.g
+        if _numpy_buffers(src, dst):
+            P = _as_numpy(src).reshape(-1, 2)
+            X = a * P[:, 0] + b * P[:, 1] + c
+            Y = e * P[:, 0] + f * P[:, 1] + g
+            D = _as_numpy(dst).reshape(-1, 2)
+            D[:, 0] = X
+            D[:, 1] = Y
+        else:
+            for i in xrange(0, len(src), 2):
+                x = src[i]
+                y = src[i + 1]
+                dst[i] = a * x + b * y + c
+                dst[i + 1] = e * x + f * y + g
+        return dst
+
+    def transform_vectors(self, src, dst=None):
+        # As transform_points, but without translation.
+        if dst is None:
+            dst = _new_buffer_like(src)
+        a, b = self.a, self.b
+        e, f = self.e, self.f
+        if _numpy_buffers(src, dst):
+            P = _as_numpy(src).reshape(-1, 2)
+            X = a * P[:, 0] + b * P[:, 1]
+            Y = e * P[:, 0] + f * P[:, 1]
+            D = _as_numpy(dst).reshape(-1, 2)
+            D[:, 0] = X
+            D[:, 1] = Y
+        else:
+            for i in xrange(0, len(src), 2):
+                x = src[i]
+                y = src[i + 1]
+                dst[i] = a * x + b * y
+                dst[i + 1] = e * x + f * y
+        return dst
+
     def identity(self):
         self.a = self.f = self.k = 1.
         self.b = self.c = self.e = self.g = self.i = self.j = 0
@@ -719,6 +1176,226 @@ class Matrix3:
         return self
     new_rotate = classmethod(new_rotate)
 
+# a b c
+# e f g
+# (0 0 1)
+
+def _create_affine2_element(slot):
+    # Element setters drop the cached inverse.
+    def get(self):
+        return getattr(self, slot)
+    def set(self, value):
+        setattr(self, slot, value)
+        self._inverse = None
+    return property(get, set)
+
+class Affine2:
+    __slots__ = ['_a', '_b', '_c', '_e', '_f', '_g', '_inverse']
+
+    def __init__(self, a=1., b=0., c=0., e=0., f=1., g=0.):
+        self._a = a
+        self._b = b
+        self._c = c
+        self._e = e
+        self._f = f
+        self._g = g
+        self._inverse = None
+
+    a = _create_affine2_element('_a')
+    b = _create_affine2_element('_b')
+    c = _create_affine2_element('_c')
+    e = _create_affine2_element('_e')
+    f = _create_affine2_element('_f')
+    g = _create_affine2_element('_g')
+
+    def __copy__(self):
+        return self.__class__(self._a, self._b, self._c,
+                              self._e, self._f, self._g)
+
+    copy = __copy__
+
+    def __repr__(self):
+        return ('Affine2([% 8.2f % 8.2f % 8.2f\n'  \
+                '         % 8.2f % 8.2f % 8.2f])') \
+                % (self._a, self._b, self._c,
+                   self._e, self._f, self._g)
+
+    def __getstate__(self):
+        return (self._a, self._b, self._c, self._e, self._f, self._g)
+
+    def __setstate__(self, state):
+        (self._a, self._b, self._c, self._e, self._f, self._g) = state
+        self._inverse = None
+
+    def __mul__(self, other):
+        if isinstance(other, Affine2):
+            return self.compose_into(other, Affine2())
+        elif isinstance(other, Point2):
+            return Point2(self._a * other.x + self._b * other.y + self._c,
+                          self._e * other.x + self._f * other.y + self._g)
+        elif isinstance(other, Vector2):
+            return Vector2(self._a * other.x + self._b * other.y,
+                           self._e * other.x + self._f * other.y)
+        else:
+            other = other.copy()
+            other._apply_transform(self)
+            return other
+
+    def __imul__(self, other):
+        assert isinstance(other, Affine2)
+        return self.compose_into(other, self)
+
+    def compose_into(self, other, out):
+        # out = self * other.  out may be self or other.
+        assert isinstance(other, Affine2) and isinstance(out, Affine2)
+        Aa = self._a
+        Ab = self._b
+        Ac = self._c
+        Ae = self._e
+        Af = self._f
+        Ag = self._g
+        Ba = other._a
+        Bb = other._b
+        Bc = other._c
+        Be = other._e
+        Bf = other._f
+        Bg = other._g
+        out._a = Aa * Ba + Ab * Be
+        out._b = Aa * Bb + Ab * Bf
+        out._c = Aa * Bc + Ab * Bg + Ac
+        out._e = Ae * Ba + Af * Be
+        out._f = Ae * Bb + Af * Bf
+        out._g = Ae * Bc + Af * Bg + Ag
+        out._inverse = None
+        return out
+
+    def identity(self):
+        self._a = self._f = 1.
+        self._b = self._c = self._e = self._g = 0.
+        self._inverse = None
+        return self
+
+    def scale(self, x, y):
+        self._a *= x
+        self._b *= y
+        self._e *= x
+        self._f *= y
+        self._inverse = None
+        return self
+
+    def translate(self, x, y):
+        self._c += self._a * x + self._b * y
+        self._g += self._e * x + self._f * y
+        self._inverse = None
+        return self
+
+    def rotate(self, angle):
+        self *= Affine2.new_rotate(angle)
+        return self
+
+    def determinant(self):
+        return self._a * self._f - self._b * self._e
+
+    def inverse(self):
+        # The inverse is computed once and cached until self is modified.
+        # It is shared between calls and must not be modified.
+        if self._inverse is None:
+            d = self.determinant()
+            if d == 0:
+                # No inverse, return identity (see Matrix4.inverse).
+                self._inverse = Affine2()
+            else:
+                a = self._f / d
+                b = -self._b / d
+                e = -self._e / d
+                f = self._a / d
+                self._inverse = Affine2(a, b, -a * self._c - b * self._g,
+                                        e, f, -e * self._c - f * self._g)
+        return self._inverse
+
+    def transform_points(self, src, dst=None):
+        # As Matrix3.transform_points.
+        if dst is None:
+            dst = _new_buffer_like(src)
+        a, b, c = self._a, self._b, self._c
+        e, f, g = self._e, self._f, self._g
+        if _numpy_buffers(src, dst):
+            P = _as_numpy(src).reshape(-1, 2)
+            X = a * P[:, 0] + b * P[:, 1] + c
+            Y = e * P[:, 0] + f * P[:, 1] + g
+            D = _as_numpy(dst).reshape(-1, 2)
+            D[:, 0] = X
+            D[:, 1] = Y
+        else:
+            for i in xrange(0, len(src), 2):
+                x = src[i]
+                y = src[i + 1]
+                dst[i] = a * x + b * y + c
+                dst[i + 1] = e * x + f * y + g
+        return dst
+
+    def transform_vectors(self, src, dst=None):
+        # As Matrix3.transform_vectors.
+        if dst is None:
+            dst = _new_buffer_like(src)
+        a, b = self._a, self._b
+        e, f = self._e, self._f
+        if _numpy_buffers(src, dst):
+            P = _as_numpy(src).reshape(-1, 2)
+            X = a * P[:, 0] + b * P[:, 1]
+            Y = e * P[:, 0] + f * P[:, 1]
+            D = _as_numpy(dst).reshape(-1, 2)
+            D[:, 0] = X
+            D[:, 1] = Y
+        else:
+            for i in xrange(0, len(src), 2):
+                x = src[i]
+                y = src[i + 1]
+                dst[i] = a * x + b * y
+                dst[i + 1] = e * x + f * y
+        return dst
+
+    def get_matrix(self):
+        M = Matrix3()
+        M.a = self._a
+        M.b = self._b
+        M.c = self._c
+        M.e = self._e
+        M.f = self._f
+        M.g = self._g
+        return M
+
+    def get_gl_matrix(self):
+        # Column-major 4x4 matrix for glLoadMatrix/glMultMatrix.
+        return (self._a, self._e, 0., 0.,
+                self._b, self._f, 0., 0.,
+                0., 0., 1., 0.,
+                self._c, self._g, 0., 1.)
+
+    # Static constructors
+    def new_identity(cls):
+        return cls()
+    new_identity = classmethod(new_identity)
+
+    def new_scale(cls, x, y):
+        return cls(x, 0., 0., 0., y, 0.)
+    new_scale = classmethod(new_scale)
+
+    def new_translate(cls, x, y):
+        return cls(1., 0., x, 0., 1., y)
+    new_translate = classmethod(new_translate)
+
+    def new_rotate(cls, angle):
+        s = math.sin(angle)
+        c = math.cos(angle)
+        return cls(c, -s, 0., s, c, 0.)
+    new_rotate = classmethod(new_rotate)
+
+    def new_matrix3(cls, m):
+        assert isinstance(m, Matrix3)
+        return cls(m.a, m.b, m.c, m.e, m.f, m.g)
+    new_matrix3 = classmethod(new_matrix3)
+
 # a b c d
 # e f g h
 # i j k l
@@ -918,6 +1595,125 @@ class Matrix4:
             P.z /= w
         return P
 
+    def compose_into(self, other, out):
+        # out = self * other.  out may be self or other.
+        assert isinstance(other, Matrix4) and isinstance(out, Matrix4)
+        # Cache attributes in local vars (see Matrix3.__mul__).
+        Aa = self.a
+        Ab = self.b
+        Ac = self.c
+        Ad = self.d
+        Ae = self.e
+        Af = self.f
+        Ag = self.g
+        Ah = self.h
+        Ai = self.i
+        Aj = self.j
+        Ak = self.k
+        Al = self.l
+        Am = self.m
+        An = self.n
+        Ao = self.o
+        Ap = self.p
+        Ba = other.a
+        Bb = other.b
+        Bc = other.c
+        Bd = other.d
+        Be = other.e
+        Bf = other.f
+        Bg = other.g
+        Bh = other.h
+        Bi = other.i
+        Bj = other.j
+        Bk = other.k
+        Bl = other.l
+        Bm = other.m
+        Bn = other.n
+        Bo = other.o
+        Bp = other.p
+        out.a = Aa * Ba + Ab * Be + Ac * Bi + Ad * Bm
+        out.b = Aa * Bb + Ab * Bf + Ac * Bj + Ad * Bn
+        out.c = Aa * Bc + Ab * Bg + Ac * Bk + Ad * Bo
+        out.d = Aa * Bd + Ab * Bh + Ac * Bl + Ad * Bp
+        out.e = Ae * Ba + Af * Be + Ag * Bi + Ah * Bm
+        out.f = Ae * Bb + Af * Bf + Ag * Bj + Ah * Bn
+        out.g = Ae * Bc + Af * Bg + Ag * Bk + Ah * Bo
+        out.h = Ae * Bd + Af * Bh + Ag * Bl + Ah * Bp
+        out.i = Ai * Ba + Aj * Be + Ak * Bi + Al * Bm
+        out.j = Ai * Bb + Aj * Bf + Ak * Bj + Al * Bn
+        out.k = Ai * Bc + Aj * Bg + Ak * Bk + Al * Bo
+        out.l = Ai * Bd + Aj * Bh + Ak * Bl + Al * Bp
+        out.m = Am * Ba + An * Be + Ao * Bi + Ap * Bm
+        out.n = Am * Bb + An * Bf + Ao * Bj + Ap * Bn
+        out.o = Am * Bc + An * Bg + Ao * Bk + Ap * Bo
+        out.p = Am * Bd + An * Bh + Ao * Bl + Ap * Bp
+        return out
+
+    def transform_points(self, src, dst=None):
+        # Transforms a flat buffer (or an N x 3 numpy array) of points in
+        # one call, dividing by w as in transform.  dst may be src.
+        if dst is None:
+            dst = _new_buffer_like(src)
+        a, b, c, d = self.a, self.b, self.c, self.d
+        e, f, g, h = self.e, self.f, self.g, self.h
+        i, j, k, l = self.i, self.j, self.k, self.l
+        m, n, o, p = self.m, self.n, self.o, self.p
+        if _numpy_buffers(src, dst):
+            P = _as_numpy(src).reshape(-1, 3)
+            x = P[:, 0]
+            y = P[:, 1]
+            z = P[:, 2]
+            X = a * x + b * y + c * z + d
+            Y = e * x + f * y + g * z + h
+            Z = i * x + j * y + k * z + l
+            W = m * x + n * y + o * z + p
+            W[W == 0] = 1.
+            D = _as_numpy(dst).reshape(-1, 3)
+            D[:, 0] = X / W
+            D[:, 1] = Y / W
+            D[:, 2] = Z / W
+        else:
+            for q in xrange(0, len(src), 3):
+                x = src[q]
+                y = src[q + 1]
+                z = src[q + 2]
+                w = m * x + n * y + o * z + p
+                if w == 0:
+                    w = 1.
+                dst[q] = (a * x + b * y + c * z + d) / w
+                dst[q + 1] = (e * x + f * y + g * z + h) / w
+                dst[q + 2] = (i * x + j * y + k * z + l) / w
+        return dst
+
+    def transform_vectors(self, src, dst=None):
+        # As transform_points, but without translation or division by w.
+        if dst is None:
+            dst = _new_buffer_like(src)
+        a, b, c = self.a, self.b, self.c
+        e, f, g = self.e, self.f, self.g
+        i, j, k = self.i, self.j, self.k
+        if _numpy_buffers(src, dst):
+            P = _as_numpy(src).reshape(-1, 3)
+            x = P[:, 0]
+            y = P[:, 1]
+            z = P[:, 2]
+            X = a * x + b * y + c * z
+            Y = e * x + f * y + g * z
+            Z = i * x + j * y + k * z
+            D = _as_numpy(dst).reshape(-1, 3)
+            D[:, 0] = X
+            D[:, 1] = Y
+            D[:, 2] = Z
+        else:
+            for q in xrange(0, len(src), 3):
+                x = src[q]
+                y = src[q + 1]
+                z = src[q + 2]
+                dst[q] = a * x + b * y + c * z
+                dst[q + 1] = e * x + f * y + g * z
+                dst[q + 2] = i * x + j * y + k * z
+        return dst
+
     def identity(self):
         self.a = self.f = self.k = self.p = 1.
         self.b = self.c = self.d = self.e = self.g = self.h = \
@@ -1470,11 +2266,108 @@ class Quaternion:
         return Q
     new_interpolate = classmethod(new_interpolate)
 
+    def interpolate_array(cls, q1, q2, t, out=None):
+        # Batched new_interpolate.  q1, q2 and out are flat buffers of
+        # (w, x, y, z) quaternions; t is a buffer with one value per pair, or
+        # a single number.  Results match new_interpolate pair by pair.
+        assert len(q1) == len(q2) and len(q1) % 4 == 0
+        count = len(q1) // 4
+        if type(t) in (int, long, float):
+            t = [t] * count
+        assert len(t) == count
+        if numpy is not None:
+            Q1 = _as_numpy(q1).reshape(-1, 4).copy()
+            Q2 = _as_numpy(q2).reshape(-1, 4)
+            t = _as_numpy(t)
+            costheta = (Q1 * Q2).sum(axis=1)
+            negative = costheta < 0.
+            Q1[negative, 1:] *= -1
+            costheta = numpy.minimum(numpy.abs(costheta), 1.)
+            theta = numpy.arccos(costheta)
+            sintheta = numpy.sqrt(1.0 - costheta * costheta)
+            small_theta = numpy.abs(theta) < 0.01
+            small_sintheta = numpy.abs(sintheta) < 0.01
+            sintheta[small_sintheta] = 1.
+            ratio1 = numpy.sin((1 - t) * theta) / sintheta
+            ratio2 = numpy.sin(t * theta) / sintheta
+            ratio1[small_sintheta] = 0.5
+            ratio2[small_sintheta] = 0.5
+            ratio1[small_theta] = 0.
+            ratio2[small_theta] = 1.
+            result = Q1 * ratio1[:, numpy.newaxis] + \
+                     Q2 * ratio2[:, numpy.newaxis]
+            if out is None:
+                return result.ravel()
+            if isinstance(out, numpy.ndarray):
+                out.reshape(-1, 4)[:] = result
+            else:
+                out[:] = array.array('d', result.ravel())
+            return out
+
+        if out is None:
+            out = array.array('d', [0.]) * len(q1)
+        for i in xrange(count):
+            j = 4 * i
+            w1, x1, y1, z1 = q1[j], q1[j + 1], q1[j + 2], q1[j + 3]
+            w2, x2, y2, z2 = q2[j], q2[j + 1], q2[j + 2], q2[j + 3]
+            costheta = w1 * w2 + x1 * x2 + y1 * y2 + z1 * z2
+            if costheta < 0.:
+                costheta = -costheta
+                x1, y1, z1 = -x1, -y1, -z1
+            if costheta > 1:
+                costheta = 1
+            theta = math.acos(costheta)
+            sintheta = math.sqrt(1.0 - costheta * costheta)
+            if abs(theta) < 0.01:
+                ratio1 = 0.
+                ratio2 = 1.
+            elif abs(sintheta) < 0.01:
+                ratio1 = ratio2 = 0.5
+            else:
+                ratio1 = math.sin((1 - t[i]) * theta) / sintheta
+                ratio2 = math.sin(t[i] * theta) / sintheta
+            out[j] = w1 * ratio1 + w2 * ratio2
+            out[j + 1] = x1 * ratio1 + x2 * ratio2
+            out[j + 2] = y1 * ratio1 + y2 * ratio2
+            out[j + 3] = z1 * ratio1 + z2 * ratio2
+        return out
+    interpolate_array = classmethod(interpolate_array)
+
+def interpolate_angles(a1, a2, t, out=None):
+    # Interpolates buffers of 2D rotation angles (in radians) along the
+    # shortest arc.  t is a buffer with one value per pair, or a single
+    # number.
+    assert len(a1) == len(a2)
+    if type(t) in (int, long, float):
+        t = [t] * len(a1)
+    assert len(t) == len(a1)
+    if numpy is not None:
+        A1 = _as_numpy(a1)
+        d = numpy.mod(_as_numpy(a2) - A1 + math.pi, 2 * math.pi) - math.pi
+        result = A1 + d * _as_numpy(t)
+        if out is None:
+            return result
+        if isinstance(out, numpy.ndarray):
+            out[:] = result
+        else:
+            out[:] = array.array('d', result)
+        return out
+
+    if out is None:
+        out = array.array('d', [0.]) * len(a1)
+    pi = math.pi
+    for i in xrange(len(a1)):
+        d = (a2[i] - a1[i] + pi) % (2 * pi) - pi
+        out[i] = a1[i] + d * t[i]
+    return out
+
 # Geometry
 # Much maths thanks to Paul Bourke, http://astronomy.swin.edu.au/~pbourke
 # ---------------------------------------------------------------------------
 
 class Geometry:
+    __slots__ = []
+
     def _connect_unimplemented(self, other):
         raise AttributeError, 'Cannot connect %s to %s' % \
             (self.__class__, other.__class__)
@@ -1620,6 +2513,8 @@ def _connect_circle_circle(A, B):
 
 
 class Point2(Vector2, Geometry):
+    __slots__ = []
+
     def __repr__(self):
         return 'Point2(%.2f, %.2f)' % (self.x, self.y)
 
@@ -1718,6 +2613,8 @@ class Line2(Geometry):
         return _connect_circle_line2(other, self)
 
 class Ray2(Line2):
+    __slots__ = []
+
     def __repr__(self):
         return 'Ray2(<%.2f, %.2f> + u<%.2f, %.2f>)' % \
             (self.p.x, self.p.y, self.v.x, self.v.y)
@@ -1726,6 +2623,8 @@ class Ray2(Line2):
         return u >= 0.0
 
 class LineSegment2(Line2):
+    __slots__ = []
+
     def __repr__(self):
         return 'LineSegment2(<%.2f, %.2f> to <%.2f, %.2f>)' % \
             (self.p.x, self.p.y, self.p.x + self.v.x, self.p.y + self.v.y)
@@ -1790,6 +2689,270 @@ class Circle(Geometry):
     def _connect_circle(self, other):
         return _connect_circle_circle(other, self)
 
+# Batch queries
+# ---------------------------------------------------------------------------
+# These take flat buffers of coordinates (x0, y0, x1, y1, ... for points and
+# x1, y1, x2, y2, ... for segments) and compare squared distances.
+
+def points_in_circle2(circle, points):
+    # Returns the indices of the points that intersect circle.
+    assert isinstance(circle, Circle)
+    cx = circle.c.x
+    cy = circle.c.y
+    rr = circle.r ** 2
+    if numpy is not None:
+        P = _as_numpy(points).reshape(-1, 2)
+        dd = (P[:, 0] - cx) ** 2 + (P[:, 1] - cy) ** 2
+        return numpy.flatnonzero(dd <= rr).tolist()
+    indices = []
+    for i in xrange(0, len(points), 2):
+        dx = points[i] - cx
+        dy = points[i + 1] - cy
+        if dx * dx + dy * dy <= rr:
+            indices.append(i // 2)
+    return indices
+
+def points_in_polygon2(segments, points):
+    # Returns the indices of the points inside the polygon bounded by the
+    # flat edge buffer segments, using the crossing number.
+    if numpy is not None:
+        P = _as_numpy(points).reshape(-1, 2)
+        S = _as_numpy(segments).reshape(-1, 4)
+        X = P[:, 0]
+        Y = P[:, 1]
+        inside = numpy.zeros(len(P), dtype=bool)
+        for x1, y1, x2, y2 in S[S[:, 1] != S[:, 3]].tolist():
+            xcross = numpy.where(Y == y2, x2,
+                                 (Y - y1) * (x2 - x1) / (y2 - y1) + x1)
+            inside ^= ((min(y1, y2) < Y) & (Y <= max(y1, y2)) &
+                       (X <= max(x1, x2)) & (X <= xcross))
+        return numpy.flatnonzero(inside).tolist()
+    indices = []
+    for i in xrange(0, len(points), 2):
+        x = points[i]
+        y = points[i + 1]
+        inside = False
+        for j in xrange(0, len(segments), 4):
+            x1, y1, x2, y2 = segments[j:j + 4]
+            if min(y1, y2) < y <= max(y1, y2) and x <= max(x1, x2):
+                # Exact at the end point, like Polygon.intersect.
+                if y == y2:
+                    xcross = x2
+                else:
+                    xcross = (y - y1) * (x2 - x1) / (y2 - y1) + x1
+                if x <= xcross:
+                    inside = not inside
+        if inside:
+            indices.append(i // 2)
+    return indices
+
+def nearest_point2(point, points, radius=None):
+    # Returns (index, distance) of the point nearest to point, or None if
+    # there are no points within radius.
+    assert isinstance(point, Vector2)
+    px = point.x
+    py = point.y
+    if radius is None:
+        best = float('inf')
+    else:
+        best = radius ** 2
+    index = -1
+    if numpy is not None:
+        P = _as_numpy(points).reshape(-1, 2)
+        if len(P):
+            dd = (P[:, 0] - px) ** 2 + (P[:, 1] - py) ** 2
+            i = int(dd.argmin())
+            if dd[i] <= best:
+                index = i
+                best = dd[i]
+    else:
+        for i in xrange(0, len(points), 2):
+            dx = points[i] - px
+            dy = points[i + 1] - py
+            dd = dx * dx + dy * dy
+            if dd <= best and (index == -1 or dd < best):
+                index = i // 2
+                best = dd
+    if index == -1:
+        return None
+    return index, math.sqrt(best)
+
+def nearest_segment2(point, segments, radius=None):
+    # Returns (index, distance) of the segment nearest to point, or None if
+    # there are no segments within radius.  Zero-length segments are
+    # treated as points.
+    assert isinstance(point, Vector2)
+    px = point.x
+    py = point.y
+    if radius is None:
+        best = float('inf')
+    else:
+        best = radius ** 2
+    index = -1
+    if numpy is not None:
+        S = _as_numpy(segments).reshape(-1, 4)
+        if len(S):
+            vx = S[:, 2] - S[:, 0]
+            vy = S[:, 3] - S[:, 1]
+            wx = px - S[:, 0]
+            wy = py - S[:, 1]
+            vv = vx * vx + vy * vy
+            u = wx * vx + wy * vy
+            nonzero = vv != 0
+            u[nonzero] /= vv[nonzero]
+            u[~nonzero] = 0.
+            u = numpy.clip(u, 0., 1.)
+            dx = wx - u * vx
+            dy = wy - u * vy
+            dd = dx * dx + dy * dy
+            i = int(dd.argmin())
+            if dd[i] <= best:
+                index = i
+                best = dd[i]
+    else:
+        for i in xrange(0, len(segments), 4):
+            x1 = segments[i]
+            y1 = segments[i + 1]
+            vx = segments[i + 2] - x1
+            vy = segments[i + 3] - y1
+            wx = px - x1
+            wy = py - y1
+            vv = vx * vx + vy * vy
+            if vv:
+                u = (wx * vx + wy * vy) / vv
+                if u < 0.:
+                    u = 0.
+                elif u > 1.:
+                    u = 1.
+                wx -= u * vx
+                wy -= u * vy
+            dd = wx * wx + wy * wy
+            if dd <= best and (index == -1 or dd < best):
+                index = i // 4
+                best = dd
+    if index == -1:
+        return None
+    return index, math.sqrt(best)
+
+def _in_box2(x1, y1, x2, y2, x, y):
+    return min(x1, x2) <= x <= max(x1, x2) and \
+           min(y1, y2) <= y <= max(y1, y2)
+
+def _segments2_intersect(x1, y1, x2, y2, x3, y3, x4, y4):
+    # True if segments (x1, y1)-(x2, y2) and (x3, y3)-(x4, y4) share at
+    # least one point, including touching and collinear overlap.
+    d1 = (x4 - x3) * (y1 - y3) - (y4 - y3) * (x1 - x3)
+    d2 = (x4 - x3) * (y2 - y3) - (y4 - y3) * (x2 - x3)
+    d3 = (x2 - x1) * (y3 - y1) - (y2 - y1) * (x3 - x1)
+    d4 = (x2 - x1) * (y4 - y1) - (y2 - y1) * (x4 - x1)
+    if ((d1 > 0 and d2 < 0) or (d1 < 0 and d2 > 0)) and \
+       ((d3 > 0 and d4 < 0) or (d3 < 0 and d4 > 0)):
+        return True
+    return (d1 == 0 and _in_box2(x3, y3, x4, y4, x1, y1)) or \
+           (d2 == 0 and _in_box2(x3, y3, x4, y4, x2, y2)) or \
+           (d3 == 0 and _in_box2(x1, y1, x2, y2, x3, y3)) or \
+           (d4 == 0 and _in_box2(x1, y1, x2, y2, x4, y4))
+
+class _IntervalSet:
+    # Set of items with closed intervals [lo, hi] on the integers 0 to
+    # size - 1, for finding the items that overlap an interval.  [lo, hi]
+    # overlaps [c, d] if it contains c, or if lo is in (c, d].  The first
+    # are found by stabbing a segment tree at c, and the second by bisecting
+    # a sorted list of interval starts.
+
+    def __init__(self, size):
+        self.size = size
+        self.covers = [None] * (2 * size)
+        self.starts = []
+        self.ranges = {}
+
+    def insert(self, item, lo, hi):
+        self.ranges[item] = lo, hi
+        covers = self.covers
+        for node in self._cover_nodes(lo, hi):
+            if covers[node] is None:
+                covers[node] = set()
+            covers[node].add(item)
+        bisect.insort(self.starts, (lo, item))
+
+    def remove(self, item):
+        lo, hi = self.ranges.pop(item)
+        for node in self._cover_nodes(lo, hi):
+            self.covers[node].discard(item)
+        del self.starts[bisect.bisect_left(self.starts, (lo, item))]
+
+    def _cover_nodes(self, lo, hi):
+        # The canonical nodes covering lo to hi, inclusive.
+        nodes = []
+        lo += self.size
+        hi += self.size + 1
+        while lo < hi:
+            if lo & 1:
+                nodes.append(lo)
+                lo += 1
+            if hi & 1:
+                hi -= 1
+                nodes.append(hi)
+            lo >>= 1
+            hi >>= 1
+        return nodes
+
+    def query(self, c, d):
+        items = []
+        covers = self.covers
+        node = c + self.size
+        while node:
+            if covers[node]:
+                items.extend(covers[node])
+            node >>= 1
+        starts = self.starts
+        for k in xrange(bisect.bisect_left(starts, (c + 1,)),
+                        bisect.bisect_left(starts, (d + 1,))):
+            items.append(starts[k][1])
+        return items
+
+def intersect_segments2(segments):
+    # Returns the sorted (i, j) index pairs, i < j, of all intersecting
+    # segments.  segments is a sequence of LineSegment2 or a flat buffer of
+    # x1, y1, x2, y2 coordinates.
+    #
+    # Segments are swept in order of their left end.  The active segments,
+    # whose x range covers the sweep position, are kept in an interval set
+    # on y, so that only pairs whose bounding boxes overlap are visited,
+    # and those are tested exactly.  With k such pairs, this takes
+    # O((n + k) log n), apart from moving the list of interval starts.
+    if len(segments) and isinstance(segments[0], Line2):
+        coords = []
+        for s in segments:
+            coords.extend((s.p.x, s.p.y, s.p.x + s.v.x, s.p.y + s.v.y))
+        segments = coords
+    ys = sorted(set(segments[1::2]))
+    size = 1
+    while size < len(ys):
+        size *= 2
+    boxes = []
+    for i in xrange(0, len(segments), 4):
+        x1, y1, x2, y2 = segments[i:i + 4]
+        # The y range as indices into ys.
+        lo = bisect.bisect_left(ys, min(y1, y2))
+        hi = bisect.bisect_left(ys, max(y1, y2))
+        boxes.append((min(x1, x2), max(x1, x2), lo, hi, i // 4,
+                      x1, y1, x2, y2))
+    active = _IntervalSet(size)
+    ends = []
+    pairs = []
+    for box in sorted(boxes):
+        min_x, max_x, lo, hi, i, x1, y1, x2, y2 = box
+        while ends and ends[0][0] < min_x:
+            active.remove(heapq.heappop(ends)[1])
+        for j in active.query(lo, hi):
+            if _segments2_intersect(x1, y1, x2, y2, *boxes[j][5:]):
+                pairs.append((min(i, j), max(i, j)))
+        active.insert(i, lo, hi)
+        heapq.heappush(ends, (max_x, i))
+    pairs.sort()
+    return pairs
+
 # 3D Geometry
 # -------------------------------------------------------------------------
 
@@ -1961,6 +3124,8 @@ def _intersect_plane_plane(A, B):
                  A.n.cross(B.n))
 
 class Point3(Vector3, Geometry):
+    __slots__ = []
+
     def __repr__(self):
         return 'Point3(%.2f, %.2f, %.2f)' % (self.x, self.y, self.z)
 
@@ -2073,6 +3238,8 @@ class Line3:
             return c
 
 class Ray3(Line3):
+    __slots__ = []
+
     def __repr__(self):
         return 'Ray3(<%.2f, %.2f, %.2f> + u<%.2f, %.2f, %.2f>)' % \
             (self.p.x, self.p.y, self.p.z, self.v.x, self.v.y, self.v.z)
@@ -2081,6 +3248,8 @@ class Ray3(Line3):
         return u >= 0.0
 
 class LineSegment3(Line3):
+    __slots__ = []
+
     def __repr__(self):
         return 'LineSegment3(<%.2f, %.2f, %.2f> to <%.2f, %.2f, %.2f>)' % \
             (self.p.x, self.p.y, self.p.z,
@@ -0,0 +1,5 @@
+"""
+Tests for euclid and torn.  Run from the lib directory with:
+
+  python -m unittest discover tests
+"""
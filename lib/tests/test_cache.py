@@ -0,0 +1,69 @@
+import cPickle
+import os
+import shutil
+import tempfile
+import unittest
+
+from torn.cache import *
+
+class LRUCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'cache.pickle')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_eviction(self):
+        cache = LRUCache(max_size=3)
+        for key in 'abc':
+            cache[key] = key.upper()
+        # Reading an item makes it the most recently used.
+        self.assertEqual(cache['a'], 'A')
+        cache['d'] = 'D'
+        self.assertEqual(len(cache), 3)
+        self.assertFalse('b' in cache)
+        self.assertEqual(cache.get('b'), None)
+        self.assertRaises(KeyError, cache.__getitem__, 'b')
+        cache['c'] = 'C2'
+        cache['e'] = 'E'
+        self.assertEqual([key for key in 'abcde' if key in cache],
+                         ['c', 'd', 'e'])
+        self.assertEqual(cache['c'], 'C2')
+
+    def test_save_load(self):
+        cache = LRUCache(version=2)
+        cache[('hash', 'triangles')] = ((0, 1, 2),)
+        cache['other'] = 1
+        cache.save(self.path)
+        loaded = LRUCache(version=2)
+        loaded.load(self.path)
+        self.assertEqual(len(loaded), 2)
+        self.assertEqual(loaded[('hash', 'triangles')], ((0, 1, 2),))
+
+    def test_version_mismatch(self):
+        cache = LRUCache(version=1)
+        cache['key'] = 'value'
+        cache.save(self.path)
+        loaded = LRUCache(version=2)
+        loaded.load(self.path)
+        self.assertEqual(len(loaded), 0)
+
+    def test_unversioned_file(self):
+        # Saved as a plain list of items, before versions were saved.
+        file_ = open(self.path, 'wb')
+        try:
+            cPickle.dump([('key', 'value')], file_)
+        finally:
+            file_.close()
+        loaded = LRUCache()
+        loaded.load(self.path)
+        self.assertEqual(len(loaded), 0)
+
+    def test_missing_file(self):
+        cache = LRUCache()
+        cache.load(self.path)
+        self.assertEqual(len(cache), 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,431 @@
+import array
+import cPickle
+import euclid
+from euclid import *
+from math import *
+import random
+import unittest
+
+def _random_vectors(rng, n):
+    return [Vector2(rng.uniform(-1, 1), rng.uniform(-1, 1)) for _ in xrange(n)]
+
+def _segments(coords):
+    segments = []
+    n = len(coords) // 2
+    for i in xrange(n):
+        segments.extend(coords[2 * i - 2:2 * i or None])
+        segments.extend(coords[2 * i:2 * i + 2])
+    return segments
+
+def _crossing_number(coords, x, y):
+    # Reference point in polygon test, for points off the boundary.
+    inside = False
+    n = len(coords) // 2
+    for i in xrange(n):
+        x1, y1 = coords[2 * i - 2], coords[2 * i - 1]
+        x2, y2 = coords[2 * i], coords[2 * i + 1]
+        if (y1 > y) != (y2 > y) and \
+           x < (y - y1) * (x2 - x1) / (y2 - y1) + x1:
+            inside = not inside
+    return inside
+
+class Vector2ArrayTest(unittest.TestCase):
+    def setUp(self):
+        self.numpy = euclid.numpy
+
+    def tearDown(self):
+        euclid.numpy = self.numpy
+
+    def assert_vectors(self, actual, expected):
+        self.assertEqual(len(actual), len(expected))
+        for a, e in zip(actual, expected):
+            self.assertAlmostEqual(a[0], e[0])
+            self.assertAlmostEqual(a[1], e[1])
+
+    def assert_values(self, actual, expected):
+        self.assertEqual(len(actual), len(expected))
+        for a, e in zip(actual, expected):
+            self.assertAlmostEqual(a, e)
+
+    def check(self):
+        rng = random.Random(1)
+        vectors = _random_vectors(rng, 20) + [Vector2(0, 0)]
+        others = _random_vectors(rng, 21)
+        V = Vector2Array(vectors)
+        W = Vector2Array(others)
+        point = Point2(0.5, -0.25)
+        self.assertEqual(len(V), 21)
+        self.assertEqual(V.get_vectors(), vectors)
+        self.assertTrue(all(isinstance(p, Point2) for p in V.get_points()))
+        self.assertEqual(V[-1], vectors[-1])
+        self.assertRaises(IndexError, V.__getitem__, 21)
+        self.assert_vectors(V + W, [v + w for v, w in zip(vectors, others)])
+        self.assert_vectors(V - W, [v - w for v, w in zip(vectors, others)])
+        self.assert_vectors(V - point, [v - point for v in vectors])
+        self.assert_vectors(point - V, [point - v for v in vectors])
+        self.assert_vectors(V * 2, [v * 2 for v in vectors])
+        self.assert_vectors(-V, [-v for v in vectors])
+        self.assert_vectors(V.cross(), [v.cross() for v in vectors])
+        self.assert_vectors(V.normalized(), [v.normalized() for v in vectors])
+        self.assert_values(abs(V), [abs(v) for v in vectors])
+        self.assert_values(V.dot(W), [v.dot(w) for v, w in zip(vectors,
+                                                               others)])
+
+        U = V.copy()
+        U += W
+        U *= 0.5
+        U[0] = (7, 8)
+        self.assert_vectors(U, [(7, 8)] + [(v + w) * 0.5 for v, w in
+                                           zip(vectors[1:], others[1:])])
+        self.assertEqual(V.get_vectors(), vectors)
+
+    def test_numpy(self):
+        if euclid.numpy is None:
+            return
+        self.check()
+
+    def test_fallback(self):
+        euclid.numpy = None
+        self.check()
+
+class TransformPointsTest(unittest.TestCase):
+    def setUp(self):
+        self.numpy = euclid.numpy
+
+    def tearDown(self):
+        euclid.numpy = self.numpy
+
+    def assert_coords(self, actual, expected):
+        self.assertEqual(len(actual), len(expected))
+        for a, e in zip(actual, expected):
+            self.assertAlmostEqual(a, e)
+
+    def buffers(self, coords):
+        buffers = [array.array('d', coords)]
+        if euclid.numpy is not None:
+            buffers.append(euclid.numpy.array(coords))
+        return buffers
+
+    def check(self):
+        rng = random.Random(2)
+        M = Matrix3.new_translate(1, -2) * Matrix3.new_rotate(0.3) * \
+            Matrix3.new_scale(2, 0.5)
+        points = [Point2(rng.uniform(-1, 1), rng.uniform(-1, 1))
+                  for _ in xrange(10)]
+        coords = [c for p in points for c in p]
+        expected = [c for p in points for c in M * p]
+        expected_vectors = [c for p in points for c in M * Vector2(*p)]
+        for src in self.buffers(coords):
+            self.assert_coords(M.transform_points(src), expected)
+            self.assert_coords(M.transform_vectors(src), expected_vectors)
+            self.assert_coords(src, coords)
+            self.assertTrue(M.transform_points(src, src) is src)
+            self.assert_coords(src, expected)
+
+        M = Matrix4.new_translate(1, -2, 3) * \
+            Matrix4.new_rotate_axis(0.3, Vector3(1, 2, 3)) * \
+            Matrix4.new_scale(2, 0.5, 1)
+        points = [Point3(rng.uniform(-1, 1), rng.uniform(-1, 1),
+                         rng.uniform(-1, 1)) for _ in xrange(10)]
+        coords = [c for p in points for c in p]
+        expected = [c for p in points for c in M.transform(p)]
+        for src in self.buffers(coords):
+            self.assert_coords(M.transform_points(src), expected)
+            dst = M.transform_points(src, src)
+            self.assert_coords(dst, expected)
+
+    def test_numpy(self):
+        if euclid.numpy is None:
+            return
+        self.check()
+
+    def test_fallback(self):
+        euclid.numpy = None
+        self.check()
+
+class InPlaceTest(unittest.TestCase):
+    def test_vector2(self):
+        v = Vector2(3, 4)
+        w = Vector2(1, 2)
+        out = Vector2()
+        self.assertTrue(v.sub_into(w, out) is out)
+        self.assertEqual(out, Vector2(2, 2))
+        self.assertEqual(v.lerp_into(w, 0.5, out), Vector2(2, 3))
+        self.assertEqual(v.normalize_into(out), Vector2(0.6, 0.8))
+        self.assertEqual(Vector2().normalize_into(out), Vector2(0, 0))
+        self.assertTrue(v.add_scaled(w, 2) is v)
+        self.assertEqual(v, Vector2(5, 8))
+        self.assertEqual(v.set_from((1, 1)), Vector2(1, 1))
+        self.assertEqual(v.set_from(w), w)
+
+    def test_vector3(self):
+        v = Vector3(3, 4, 12)
+        w = Vector3(1, 2, 2)
+        out = Vector3()
+        self.assertEqual(v.sub_into(w, out), Vector3(2, 2, 10))
+        self.assertEqual(v.lerp_into(w, 0.5, out), Vector3(2, 3, 7))
+        self.assertEqual(v.normalize_into(out), v.normalized())
+        self.assertEqual(v.add_scaled(w, -1), Vector3(2, 2, 10))
+
+    def assert_matrix(self, actual, expected, names):
+        for name in names:
+            self.assertAlmostEqual(getattr(actual, name),
+                                   getattr(expected, name))
+
+    def test_compose_into(self):
+        for cls, names, A, B in (
+            (Matrix3, 'abcefgijk',
+             Matrix3.new_rotate(0.5).translate(1, 2),
+             Matrix3.new_scale(2, 3).rotate(-0.2)),
+            (Matrix4, 'abcdefghijklmnop',
+             Matrix4.new_rotate_axis(0.5, Vector3(1, 0, 1)).translate(1, 2,
+                                                                      3),
+             Matrix4.new_scale(2, 3, 4).rotatez(-0.2))):
+            expected = A * B
+            self.assert_matrix(A.compose_into(B, cls()), expected, names)
+            out = B.copy()
+            self.assertTrue(A.compose_into(out, out) is out)
+            self.assert_matrix(out, expected, names)
+            out = A.copy()
+            self.assert_matrix(out.compose_into(B, out), expected, names)
+
+class InterpolateTest(unittest.TestCase):
+    def setUp(self):
+        self.numpy = euclid.numpy
+
+    def tearDown(self):
+        euclid.numpy = self.numpy
+
+    def check_quaternions(self):
+        rng = random.Random(4)
+        pairs = []
+        for _ in xrange(50):
+            pairs.append([Quaternion.new_rotate_axis(
+                rng.uniform(-pi, pi), Vector3(rng.uniform(-1, 1),
+                                              rng.uniform(-1, 1), 1))
+                          for _ in xrange(2)])
+        q = Quaternion.new_rotate_axis(1, Vector3(0, 0, 1))
+        # Nearly equal, and on opposite hemispheres.
+        pairs.append((q, q.copy()))
+        pairs.append((q, Quaternion(-q.w, -q.x, -q.y, -q.z)))
+        q1 = [c for q1, _ in pairs for c in (q1.w, q1.x, q1.y, q1.z)]
+        q2 = [c for _, q2 in pairs for c in (q2.w, q2.x, q2.y, q2.z)]
+        ts = [rng.random() for _ in pairs]
+        for t, out in ((ts, None), (ts, array.array('d', q1)), (0.25, None)):
+            result = Quaternion.interpolate_array(q1, q2, t, out)
+            if out is not None:
+                self.assertTrue(result is out)
+            for i, (a, b) in enumerate(pairs):
+                if isinstance(t, list):
+                    q = Quaternion.new_interpolate(a, b, t[i])
+                else:
+                    q = Quaternion.new_interpolate(a, b, t)
+                for j, c in enumerate((q.w, q.x, q.y, q.z)):
+                    self.assertAlmostEqual(result[4 * i + j], c)
+
+    def check_angles(self):
+        a1 = [0, 3, -3, 1, 0.5]
+        a2 = [1, -3, 3, 1, 0.5 + 4 * pi]
+        result = interpolate_angles(a1, a2, 0.5)
+        for actual, expected in zip(result, [0.5, pi, -pi, 1, 0.5]):
+            self.assertAlmostEqual(actual, expected)
+        out = array.array('d', [0.]) * 2
+        self.assertTrue(interpolate_angles([0, 0], [1, -1], [0.25, 1],
+                                           out) is out)
+        self.assertEqual(list(out), [0.25, -1])
+
+    def test_numpy(self):
+        if euclid.numpy is None:
+            return
+        self.check_quaternions()
+        self.check_angles()
+
+    def test_fallback(self):
+        euclid.numpy = None
+        self.check_quaternions()
+        self.check_angles()
+
+class Affine2Test(unittest.TestCase):
+    def assert_affine(self, actual, expected):
+        for name in 'abcefg':
+            self.assertAlmostEqual(getattr(actual, name),
+                                   getattr(expected, name))
+
+    def test_inverse(self):
+        A = Affine2.new_translate(1, 2).rotate(0.3).scale(2, 0.5)
+        inverse = A.inverse()
+        self.assertTrue(A.inverse() is inverse)
+        self.assert_affine(A * inverse, Affine2())
+        self.assert_affine(inverse * A, Affine2())
+        point = Point2(3, -1)
+        self.assertAlmostEqual(abs(inverse * (A * point) - point), 0)
+
+    def test_modified(self):
+        for modify in (lambda A: A.translate(1, 0),
+                       lambda A: A.scale(2, 2),
+                       lambda A: A.rotate(1),
+                       lambda A: A.identity(),
+                       lambda A: A.compose_into(Affine2.new_scale(2, 1), A),
+                       lambda A: setattr(A, 'c', 5)):
+            A = Affine2.new_rotate(0.5).translate(1, 1)
+            inverse = A.inverse()
+            modify(A)
+            self.assertTrue(A.inverse() is not inverse)
+            self.assert_affine(A * A.inverse(), Affine2())
+
+    def test_singular(self):
+        self.assert_affine(Affine2.new_scale(0, 1).inverse(), Affine2())
+
+    def test_matrix3(self):
+        A = Affine2.new_translate(1, 2).rotate(0.3)
+        B = Affine2.new_scale(2, 3).translate(-1, 0)
+        self.assert_affine(A * B, Affine2.new_matrix3(A.get_matrix() *
+                                                      B.get_matrix()))
+        coords = array.array('d', [1, 2, 3, -4])
+        self.assertEqual(list(A.transform_points(coords)),
+                         list(A.get_matrix().transform_points(coords)))
+
+class BatchQueryTest(unittest.TestCase):
+    def setUp(self):
+        self.numpy = euclid.numpy
+
+    def tearDown(self):
+        euclid.numpy = self.numpy
+
+    def check(self):
+        rng = random.Random(6)
+        points = [rng.uniform(-1, 1) for _ in xrange(200)]
+        segments = [rng.uniform(-1, 1) for _ in xrange(200)]
+        for _ in xrange(50):
+            point = Point2(rng.uniform(-1, 1), rng.uniform(-1, 1))
+            radius = rng.uniform(0, 0.5)
+            distances = [abs(Point2(points[i], points[i + 1]) - point)
+                         for i in xrange(0, len(points), 2)]
+            self.assertEqual(points_in_circle2(Circle(point, radius),
+                                               points),
+                             [i for i, d in enumerate(distances)
+                              if d <= radius])
+            index, distance = nearest_point2(point, points)
+            self.assertAlmostEqual(distance, min(distances))
+            self.assertAlmostEqual(distances[index], distance)
+
+            distances = [LineSegment2(Point2(*segments[i:i + 2]),
+                                      Point2(*segments[i + 2:i + 4])
+                                      ).distance(point)
+                         for i in xrange(0, len(segments), 4)]
+            index, distance = nearest_segment2(point, segments)
+            self.assertAlmostEqual(distance, min(distances))
+            self.assertAlmostEqual(distances[index], distance)
+            if min(distances) > radius:
+                self.assertEqual(nearest_segment2(point, segments, radius),
+                                 None)
+
+        self.assertEqual(nearest_point2(Point2(), []), None)
+        self.assertEqual(nearest_segment2(Point2(1, 1), [0, 0, 0, 0]),
+                         (0, sqrt(2)))
+
+    def test_numpy(self):
+        if euclid.numpy is None:
+            return
+        self.check()
+
+    def test_fallback(self):
+        euclid.numpy = None
+        self.check()
+
+class IntersectSegmentsTest(unittest.TestCase):
+    def assert_brute_force(self, segments):
+        n = len(segments) // 4
+        expected = [(i, j) for i in xrange(n) for j in xrange(i + 1, n)
+                    if euclid._segments2_intersect(
+                        *(segments[4 * i:4 * i + 4] +
+                          segments[4 * j:4 * j + 4]))]
+        self.assertEqual(intersect_segments2(segments), expected)
+
+    def test_random(self):
+        rng = random.Random(1)
+        for _ in xrange(100):
+            self.assert_brute_force([rng.random() for _ in
+                                     xrange(4 * rng.randint(0, 30))])
+
+    def test_grid(self):
+        # Touching, collinear and degenerate segments.
+        rng = random.Random(2)
+        for _ in xrange(200):
+            self.assert_brute_force([rng.randint(0, 4) for _ in
+                                     xrange(4 * rng.randint(0, 30))])
+
+    def test_line_segments(self):
+        segments = [LineSegment2(Point2(0, 0), Point2(2, 2)),
+                    LineSegment2(Point2(0, 2), Point2(2, 0)),
+                    LineSegment2(Point2(3, 0), Point2(3, 1))]
+        self.assertEqual(intersect_segments2(segments), [(0, 1)])
+
+class PickleTest(unittest.TestCase):
+    def test_round_trip(self):
+        for obj in (Vector2(1, 2), Point2(3, 4), Vector3(1, 2, 3),
+                    Circle(Point2(1, 2), 3.), Matrix3.new_rotate(0.5),
+                    Quaternion.new_rotate_axis(1, Vector3(0, 0, 1)),
+                    Affine2.new_translate(1, 2).rotate(0.5)):
+            for protocol in (0, 2):
+                copy = cPickle.loads(cPickle.dumps(obj, protocol))
+                self.assertTrue(type(copy) is type(obj))
+                self.assertEqual(repr(copy), repr(obj))
+
+    def test_tuple_state(self):
+        point = Point2(3, 4)
+        self.assertEqual(point.__getstate__(), (3, 4))
+
+    def test_legacy_state(self):
+        point = Point2.__new__(Point2)
+        point.__setstate__({'x': 3, 'y': 4})
+        self.assertEqual(point, Point2(3, 4))
+
+class SlotsTest(unittest.TestCase):
+    def test_no_dict(self):
+        for obj in (Point2(1, 2), Point3(1, 2, 3),
+                    Ray2(Point2(0, 0), Point2(1, 1)),
+                    LineSegment2(Point2(0, 0), Point2(1, 1)),
+                    Ray3(Point3(0, 0, 0), Point3(1, 1, 1)),
+                    LineSegment3(Point3(0, 0, 0), Point3(1, 1, 1))):
+            self.assertFalse(hasattr(obj, '__dict__'))
+            self.assertRaises(AttributeError, setattr, obj, 'extra', 1)
+
+    def test_inherited_state(self):
+        segment = LineSegment2(Point2(1, 2), Point2(4, 6))
+        copy = cPickle.loads(cPickle.dumps(segment, 2))
+        self.assertEqual(copy.p, segment.p)
+        self.assertEqual(copy.v, segment.v)
+        self.assertEqual(abs(copy), 5)
+
+class PointsInPolygonTest(unittest.TestCase):
+    def setUp(self):
+        self.numpy = euclid.numpy
+
+    def tearDown(self):
+        euclid.numpy = self.numpy
+
+    def check(self):
+        rng = random.Random(3)
+        for _ in xrange(20):
+            n = rng.randint(3, 40)
+            # Random polygons, usually self-intersecting.
+            coords = [rng.uniform(-1, 1) for _ in xrange(2 * n)]
+            points = [rng.uniform(-1.2, 1.2) for _ in xrange(400)]
+            expected = [i // 2 for i in xrange(0, len(points), 2)
+                        if _crossing_number(coords, points[i],
+                                            points[i + 1])]
+            self.assertEqual(points_in_polygon2(_segments(coords), points),
+                             expected)
+
+    def test_numpy(self):
+        if euclid.numpy is None:
+            return
+        self.check()
+
+    def test_fallback(self):
+        euclid.numpy = None
+        self.check()
+
+if __name__ == '__main__':
+    unittest.main()
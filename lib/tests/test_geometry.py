@@ -0,0 +1,346 @@
+import cPickle
+from euclid import *
+from math import *
+import random
+import unittest
+
+import torn.geometry
+from torn.geometry import *
+
+def _polygon(*coords):
+    return Polygon([Point2(x, y) for x, y in coords])
+
+def _comb(teeth):
+    # A base from y = 0 to 1, with teeth of width 1 from y = 1 to 3 and
+    # notches of width 1 between them.
+    coords = [(0, 0), (2 * teeth, 0)]
+    for i in xrange(teeth - 1, -1, -1):
+        coords.extend([(2 * i + 2, 1), (2 * i + 2, 3), (2 * i + 1, 3),
+                       (2 * i + 1, 1)])
+    coords.append((0, 1))
+    return _polygon(*coords)
+
+def _star(rng, n):
+    # Simple, with most vertices reflex for large n.
+    vertices = []
+    for i in xrange(n):
+        angle = 2 * pi * i / n
+        radius = rng.uniform(1, 2)
+        vertices.append(Point2(radius * cos(angle), radius * sin(angle)))
+    return Polygon(vertices)
+
+def _spiral(n):
+    outer = []
+    inner = []
+    for i in xrange(n):
+        t = 0.1 * i
+        outer.append(Point2((1.15 + 0.2 * t) * cos(t),
+                            (1.15 + 0.2 * t) * sin(t)))
+        inner.append(Point2((1 + 0.2 * t) * cos(t), (1 + 0.2 * t) * sin(t)))
+    return Polygon(outer + inner[::-1])
+
+def _crossing_number(polygon, x, y):
+    # Reference point in polygon test, for points off the boundary.
+    inside = False
+    for v1, v2 in polygon.edges:
+        if (v1.y > y) != (v2.y > y) and \
+           x < (y - v1.y) * (v2.x - v1.x) / (v2.y - v1.y) + v1.x:
+            inside = not inside
+    return inside
+
+def _test_polygons():
+    rng = random.Random(1)
+    polygons = [_star(rng, n) for n in (3, 10, 50, 300)]
+    polygons.append(_spiral(200))
+    polygons.append(_comb(20))
+    polygons.append(_polygon(*([(x, 0) for x in xrange(10)] +
+                               [(x, 5) for x in xrange(9, -1, -1)])))
+    for polygon in polygons[:]:
+        polygon = polygon.copy()
+        polygon.reverse()
+        polygons.append(polygon)
+    return polygons
+
+def _area(coords):
+    return Polygon([Point2(x, y) for x, y in coords]).area
+
+def _points(polygon):
+    return set(zip(polygon.coords[0::2], polygon.coords[1::2]))
+
+class PolygonPickleTest(unittest.TestCase):
+    def test_round_trip(self):
+        for closed in (True, False):
+            polygon = Polygon([Point2(0, 0), Point2(1, 0), Point2(1, 2)],
+                              closed)
+            for protocol in (0, 2):
+                copy = cPickle.loads(cPickle.dumps(polygon, protocol))
+                self.assertEqual(copy.vertices, polygon.vertices)
+                self.assertEqual(copy.closed, closed)
+                self.assertEqual(copy.area, polygon.area)
+
+    def test_legacy_state(self):
+        # Polygons pickled before the flat coordinate state.
+        polygon = Polygon.__new__(Polygon)
+        polygon.__setstate__({'vertices': [Point2(0, 0), Point2(1, 0),
+                                           Point2(0, 1)],
+                              'closed': False})
+        self.assertEqual(list(polygon.coords), [0, 0, 1, 0, 0, 1])
+        self.assertFalse(polygon.closed)
+
+class IntersectTest(unittest.TestCase):
+    def setUp(self):
+        self.numpy = torn.geometry.numpy
+
+    def tearDown(self):
+        torn.geometry.numpy = self.numpy
+
+    def check(self):
+        rng = random.Random(2)
+        polygons = _test_polygons()
+        # Self-intersecting, so that the index is not ordered.
+        polygons.append(Polygon([Point2(rng.uniform(-2, 2),
+                                        rng.uniform(-2, 2))
+                                 for _ in xrange(60)]))
+        for polygon in polygons:
+            min_x, min_y, max_x, max_y = polygon.bounds
+            points = []
+            for _ in xrange(300):
+                points.append(rng.uniform(min_x - 1, max_x + 1))
+                points.append(rng.uniform(min_y - 1, max_y + 1))
+            expected = [i // 2 for i in xrange(0, len(points), 2)
+                        if _crossing_number(polygon, points[i],
+                                            points[i + 1])]
+            self.assertEqual(polygon.intersect_points(points), expected)
+            self.assertEqual([i // 2 for i in xrange(0, len(points), 2)
+                              if polygon.intersect(Point2(points[i],
+                                                          points[i + 1]))],
+                             expected)
+
+    def test_numpy(self):
+        if torn.geometry.numpy is None:
+            return
+        self.check()
+
+    def test_fallback(self):
+        torn.geometry.numpy = None
+        self.check()
+
+    def test_index_size(self):
+        rng = random.Random(3)
+        star = _star(rng, 1000)
+        self.assertTrue(star.index is None)
+        comb = _comb(100)
+        self.assertTrue(comb.index is not None)
+        self.assertTrue(sum(len(slab) for slab in comb.index.slabs) <=
+                        comb.index_factor * len(comb.coords) // 2)
+        points = [rng.uniform(-2, 2) for _ in xrange(200)]
+        expected = [i // 2 for i in xrange(0, len(points), 2)
+                    if _crossing_number(star, points[i], points[i + 1])]
+        self.assertEqual(star.intersect_points(points), expected)
+        self.assertEqual([i // 2 for i in xrange(0, len(points), 2)
+                          if star.intersect(Point2(points[i],
+                                                   points[i + 1]))],
+                         expected)
+
+class TriangulationTest(unittest.TestCase):
+    def test_area(self):
+        for polygon in _test_polygons():
+            coords = polygon.coords
+            triangles = polygon.triangles
+            self.assertEqual(len(triangles), len(coords) // 2 - 2)
+            areas = [_area([(coords[2 * i], coords[2 * i + 1])
+                            for i in triangle])
+                     for triangle in triangles]
+            self.assertTrue(min(areas) >= 0)
+            self.assertAlmostEqual(sum(areas), abs(polygon.area))
+
+    def test_convex_decomposition(self):
+        for polygon in _test_polygons():
+            for max_vertices in (3, 8):
+                pieces = polygon.convex_decomposition(max_vertices)
+                for piece in pieces:
+                    self.assertTrue(3 <= len(piece) <= max_vertices)
+                    for i in xrange(len(piece)):
+                        (x1, y1), (x2, y2), (x3, y3) = (piece[i - 2],
+                                                        piece[i - 1],
+                                                        piece[i])
+                        self.assertTrue((x2 - x1) * (y3 - y1) -
+                                        (y2 - y1) * (x3 - x1) >= 0)
+                self.assertAlmostEqual(sum(_area(piece) for piece in pieces),
+                                       abs(polygon.area))
+
+class TriangleIndicesTest(unittest.TestCase):
+    def test_flat(self):
+        for polygon in _test_polygons():
+            indices = polygon.triangle_indices
+            self.assertEqual(list(indices), [i for triangle in
+                                             polygon.triangles
+                                             for i in triangle])
+            self.assertTrue(polygon.triangle_indices is indices)
+
+    def test_update(self):
+        square = _polygon((0, 0), (1, 0), (1, 1), (0, 1))
+        indices = square.triangle_indices
+        square.vertices = square.vertices[:3]
+        self.assertEqual(sorted(square.triangle_indices), [0, 1, 2])
+        self.assertTrue(square.triangle_indices is not indices)
+
+class SimplifyTest(unittest.TestCase):
+    def test_douglas_peucker(self):
+        for polygon in _test_polygons():
+            for tolerance in (0.5, 0.1, 0.01):
+                simplified = polygon.simplified(tolerance)
+                self.assertTrue(len(simplified.coords) >= 6)
+                self.assertTrue(_points(simplified) <= _points(polygon))
+                for vertex in polygon.vertices:
+                    self.assertTrue(nearest_segment2(
+                        vertex, simplified.segments,
+                        tolerance * (1 + 1e-9)) is not None)
+
+    def test_visvalingam(self):
+        for polygon in _test_polygons():
+            simplified = polygon.simplified(0.01, 'visvalingam')
+            self.assertTrue(len(simplified.coords) >= 6)
+            self.assertTrue(_points(simplified) <= _points(polygon))
+            self.assertTrue(abs(simplified.area - polygon.area) <=
+                            0.01 * len(polygon.coords))
+
+    def test_unknown_method(self):
+        square = _polygon((0, 0), (1, 0), (1, 1), (0, 1))
+        self.assertRaises(ValueError, square.simplified, 0.1, 'unknown')
+
+    def test_level_of_detail(self):
+        for polygon in _test_polygons():
+            self.assertTrue(polygon.get_level_of_detail(0) is polygon)
+            for tolerance in (1, 0.1, 0.001):
+                level = polygon.get_level_of_detail(tolerance)
+                self.assertTrue(polygon.get_level_of_detail(tolerance) is
+                                level)
+                for vertex in polygon.vertices:
+                    self.assertTrue(nearest_segment2(
+                        vertex, level.segments,
+                        tolerance * (1 + 1e-9)) is not None)
+
+class MassPropertiesTest(unittest.TestCase):
+    def setUp(self):
+        self.numpy = torn.geometry.numpy
+
+    def tearDown(self):
+        torn.geometry.numpy = self.numpy
+
+    def check(self):
+        polygons = _test_polygons()
+        for polygon, (mass, (cx, cy), inertia) in zip(
+            polygons, mass_properties(polygons, density=2)):
+            # Sum over the triangles, with the inertia of each about its own
+            # centroid moved to the polygon centroid.
+            coords = polygon.coords
+            total = 0
+            total_inertia = 0
+            for triangle in polygon.triangles:
+                (x1, y1), (x2, y2), (x3, y3) = [(coords[2 * i],
+                                                 coords[2 * i + 1])
+                                                for i in triangle]
+                area = _area([(x1, y1), (x2, y2), (x3, y3)])
+                tx = (x1 + x2 + x3) / 3
+                ty = (y1 + y2 + y3) / 3
+                total += 2 * area
+                total_inertia += 2 * area * (
+                    (x1 * x1 + x2 * x2 + x3 * x3 + x1 * x2 + x2 * x3 +
+                     x3 * x1 + y1 * y1 + y2 * y2 + y3 * y3 + y1 * y2 +
+                     y2 * y3 + y3 * y1) / 6 - (cx * cx + cy * cy))
+            centroid = polygon.centroid
+            self.assertAlmostEqual(mass, total)
+            self.assertAlmostEqual(cx, centroid.x)
+            self.assertAlmostEqual(cy, centroid.y)
+            self.assertAlmostEqual(inertia, total_inertia)
+
+    def test_numpy(self):
+        if torn.geometry.numpy is None:
+            return
+        self.check()
+
+    def test_fallback(self):
+        torn.geometry.numpy = None
+        self.check()
+
+class HashGridTest(unittest.TestCase):
+    def test_query_point(self):
+        rng = random.Random(3)
+        grid = HashGrid(0.1)
+        points = [Point2(rng.random(), rng.random()) for _ in xrange(500)]
+        for point in points:
+            grid.insert(point, (point.x, point.y, point.x, point.y))
+        for _ in xrange(50):
+            center = Point2(rng.random(), rng.random())
+            radius = rng.uniform(0, 0.3)
+            expected = sorted((abs(p - center), p) for p in points
+                              if abs(p - center) <= radius)
+            self.assertEqual(grid.query_point(center, radius),
+                             [p for _, p in expected])
+
+    def test_weld_vertices(self):
+        fixed = _polygon((0, 0), (1, 0), (1, 1))
+        polygon = _polygon((1.005, 1.004), (2, 1), (2, 1.001), (2, 2))
+        self.assertEqual(weld_vertices([polygon], 0.01, [fixed]), 2)
+        self.assertEqual(list(polygon.coords), [1, 1, 2, 1, 2, 2])
+        self.assertEqual(list(fixed.coords), [0, 0, 1, 0, 1, 1])
+
+class SplitTest(unittest.TestCase):
+    def assert_split(self, polygon, line, count):
+        pieces = polygon.split(line)
+        self.assertEqual(len(pieces), count)
+        for piece in pieces:
+            self.assertTrue(piece.simple)
+            self.assertTrue(piece.area * polygon.area > 0)
+        self.assertAlmostEqual(sum(piece.area for piece in pieces),
+                               polygon.area)
+
+    def test_convex(self):
+        square = _polygon((0, 0), (2, 0), (2, 2), (0, 2))
+        self.assert_split(square, Line2(Point2(0, 0.5), Point2(1, 1.5)), 2)
+
+    def test_partial_cut(self):
+        square = _polygon((0, 0), (2, 0), (2, 2), (0, 2))
+        self.assert_split(square, LineSegment2(Point2(-1, 1), Point2(1, 1)),
+                          1)
+
+    def test_l_shape_along_edge(self):
+        l_shape = _polygon((0, 0), (2, 0), (2, 1), (1, 1), (1, 2), (0, 2))
+        for line in (LineSegment2(Point2(-1, 1), Point2(3, 1)),
+                     LineSegment2(Point2(3, 1), Point2(-1, 1))):
+            self.assert_split(l_shape, line, 2)
+            l_shape.reverse()
+            self.assert_split(l_shape, line, 2)
+
+    def test_comb_through_notches(self):
+        comb = _comb(8)
+        for line in (LineSegment2(Point2(-1, 1), Point2(20, 1)),
+                     LineSegment2(Point2(20, 1), Point2(-1, 1))):
+            self.assert_split(comb, line, 9)
+            comb.reverse()
+            self.assert_split(comb, line, 9)
+
+    def test_comb_along_teeth(self):
+        comb = _comb(8)
+        self.assert_split(comb, Line2(Point2(0, 3), Point2(1, 3)), 1)
+        self.assert_split(comb, Line2(Point2(3, 0), Point2(3, 1)), 2)
+
+    def test_diagonal_through_vertices(self):
+        diamond = _polygon((0, -1), (1, 0), (0, 1), (-1, 0))
+        self.assert_split(diamond, Line2(Point2(-1, 0), Point2(1, 0)), 2)
+        self.assert_split(diamond, Line2(Point2(0, -1), Point2(0, 1)), 2)
+
+    def test_random_lines(self):
+        rng = random.Random(4)
+        for polygon in _test_polygons():
+            for _ in xrange(10):
+                point = Point2(rng.uniform(-1, 1), rng.uniform(-1, 1))
+                angle = rng.uniform(0, pi)
+                line = Line2(point, Vector2(cos(angle), sin(angle)))
+                pieces = polygon.split(line)
+                self.assertTrue(pieces)
+                self.assert_split(polygon, line, len(pieces))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+import cPickle as pickle
+from cStringIO import StringIO
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+try:
+    import Box2D
+    import pyglet
+except ImportError:
+    Box2D = pyglet = None
+else:
+    from torn.headless import *
+
+@unittest.skipIf(Box2D is None or pyglet is None, 'needs Box2D and pyglet')
+class HeadlessTest(unittest.TestCase):
+    def test_create_level(self):
+        level = create_level(3, 2)
+        # The floor, the two pins and the boxes.
+        self.assertEqual(len(level.polygons), 3 + 3 * 2)
+
+    def test_run(self):
+        result = run(create_level(2, 2), steps=10)
+        self.assertEqual(sorted(result),
+                         ['bodies', 'contacts', 'steps', 'steps_per_second'])
+        self.assertEqual(result['steps'], 10)
+        self.assertTrue(result['steps_per_second'] > 0)
+        # The floor and the boxes, and possibly the ground body.
+        self.assertTrue(result['bodies'] >= 1 + 2 * 2)
+        self.assertTrue(result['contacts'] >= 0)
+
+    def test_main(self):
+        directory = tempfile.mkdtemp()
+        stdout = sys.stdout
+        try:
+            path = os.path.join(directory, 'level.pickle')
+            file_ = open(path, 'wb')
+            try:
+                pickle.dump(create_level(1, 1), file_)
+            finally:
+                file_.close()
+            self.assertEqual(len(load_level(path).polygons), 4)
+            sys.stdout = StringIO()
+            self.assertEqual(main(['-n', '5', '-l', path]), 0)
+            self.assertTrue(sys.stdout.getvalue().startswith('5 steps, '))
+        finally:
+            sys.stdout = stdout
+            shutil.rmtree(directory)
+
+if __name__ == '__main__':
+    unittest.main()
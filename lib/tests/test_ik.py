@@ -0,0 +1,190 @@
+from euclid import *
+import random
+import unittest
+
+from torn import ik
+
+def _distance(vertices1, vertices2):
+    return max(abs(v1 - v2) for v1, v2 in zip(vertices1, vertices2))
+
+def _random_chain(rng, n):
+    return [Point2(rng.uniform(-1, 1), rng.uniform(-1, 1)) for _ in xrange(n)]
+
+def _lengths(vertices):
+    return [abs(v2 - v1) for v1, v2 in zip(vertices[:-1], vertices[1:])]
+
+def _test_cases(rng, n):
+    # Random chains with targets in and out of reach, at the root, and
+    # where the limb folds back on itself.
+    cases = []
+    for _ in xrange(200):
+        cases.append((_random_chain(rng, n),
+                      Point2(rng.uniform(-3, 3), rng.uniform(-3, 3))))
+    chain = [Point2(0, 0), Point2(2, 0), Point2(2, 1)][:n]
+    for target in (Point2(0, 0), Point2(0.5, 0), Point2(-0.5, 0),
+                   Point2(5, 0), Point2(1, 1)):
+        cases.append((chain, target))
+    return cases
+
+class SolveTest(unittest.TestCase):
+    def setUp(self):
+        self.numpy = ik.numpy
+
+    def tearDown(self):
+        ik.numpy = self.numpy
+
+    def check_batch(self):
+        rng = random.Random(1)
+        for n in (2, 3, 4):
+            cases = _test_cases(rng, n)
+            chains = [chain for chain, _ in cases]
+            targets = [target for _, target in cases]
+            for (chain, target), solved in zip(cases, ik.solve_batch(
+                chains, targets)):
+                self.assertTrue(_distance(ik.solve(chain, target),
+                                          solved) < 1e-9)
+
+    def test_batch_numpy(self):
+        if ik.numpy is None:
+            return
+        self.check_batch()
+
+    def test_batch_fallback(self):
+        ik.numpy = None
+        self.check_batch()
+
+    def test_two_edges(self):
+        rng = random.Random(3)
+        for chain, target in _test_cases(rng, 3):
+            solved = ik.solve(chain, target)
+            self.assertTrue(solved[0] is chain[0])
+            for expected, length in zip(_lengths(chain), _lengths(solved)):
+                self.assertAlmostEqual(expected, length)
+            lengths = _lengths(chain)
+            distance = abs(target - chain[0])
+            if abs(lengths[0] - lengths[1]) <= distance <= sum(lengths):
+                self.assertTrue(abs(solved[-1] - target) < 1e-9)
+
+class FabrikTest(unittest.TestCase):
+    def test_random_chains(self):
+        rng = random.Random(4)
+        for n in (4, 6, 10):
+            for _ in xrange(50):
+                chain = _random_chain(rng, n)
+                lengths = _lengths(chain)
+                target = Point2(rng.uniform(-3, 3), rng.uniform(-3, 3))
+                solved = ik.solve_fabrik(chain, target, tolerance=1e-6,
+                                         max_iterations=1000)
+                self.assertEqual(solved[0], chain[0])
+                for expected, length in zip(lengths, _lengths(solved)):
+                    self.assertAlmostEqual(expected, length)
+                distance = abs(target - chain[0])
+                if distance >= sum(lengths):
+                    # Stretched straight towards the target.
+                    self.assertAlmostEqual(abs(solved[-1] - chain[0]),
+                                           sum(lengths))
+                elif distance < sum(lengths) - 2 * max(lengths):
+                    self.assertTrue(abs(solved[-1] - target) < 1e-5)
+
+    def test_previous(self):
+        chain = [Point2(0, 0), Point2(1, 0), Point2(2, 0), Point2(3, 0)]
+        target = Point2(1, 2)
+        first = ik.solve_fabrik(chain, target, max_iterations=2)
+        second = ik.solve_fabrik(chain, target, first, max_iterations=2)
+        self.assertTrue(abs(second[-1] - target) <= abs(first[-1] - target))
+
+class LimbRigTest(unittest.TestCase):
+    def test_matches_solve(self):
+        rng = random.Random(2)
+        for n in (2, 3, 5):
+            for chain, target in _test_cases(rng, n):
+                rig = ik.LimbRig(chain)
+                self.assertTrue(_distance(ik.solve(chain, target),
+                                          rig.solve(target)) < 1e-9)
+
+    def test_solve_into(self):
+        rng = random.Random(3)
+        for n in (1, 2, 3, 5):
+            for chain, target in _test_cases(rng, n):
+                rig = ik.LimbRig(chain)
+                out = [v.copy() for v in chain]
+                points = list(out)
+                self.assertTrue(rig.solve_into(target, out) is out)
+                self.assertTrue(all(v is w for v, w in zip(out, points)))
+                self.assertTrue(_distance(rig.solve(target), out) < 1e-9)
+                # Solving again from out, as when dragging.
+                previous = tuple(v.copy() for v in out)
+                rig.solve_into(target, out, out)
+                self.assertTrue(_distance(rig.solve(target, previous),
+                                          out) < 1e-9)
+
+class SolveRigsTest(unittest.TestCase):
+    def setUp(self):
+        self.numpy = ik.numpy
+
+    def tearDown(self):
+        ik.numpy = self.numpy
+
+    def check(self):
+        rng = random.Random(5)
+        rigs = []
+        targets = []
+        for n in (2, 3, 5):
+            for chain, target in _test_cases(rng, n):
+                rigs.append(ik.LimbRig(chain))
+                targets.append(target)
+        rng.shuffle(rigs)
+        for rig, target, solved in zip(rigs, targets,
+                                       ik.solve_rigs(rigs, targets)):
+            self.assertTrue(_distance(rig.solve(target), solved) < 1e-9)
+
+    def test_numpy(self):
+        if ik.numpy is None:
+            return
+        self.check()
+
+    def test_fallback(self):
+        ik.numpy = None
+        self.check()
+
+class SolveCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.rigs = [ik.LimbRig([Point2(0, 0), Point2(1, 0), Point2(1, 1)]),
+                     ik.LimbRig([Point2(0, 0), Point2(0, 1)])]
+        self.cache = ik.SolveCache(resolution=0.01)
+
+    def test_matches_rig(self):
+        targets = [Point2(1.2, 0.5), Point2(0.3, 0.3)]
+        solutions = self.cache.solve_all(self.rigs, targets)
+        for rig, target, solution in zip(self.rigs, targets, solutions):
+            self.assertTrue(_distance(rig.solve(target), solution) < 1e-12)
+
+    def test_more_misses_than_size(self):
+        cache = ik.SolveCache(resolution=0.01, max_size=2)
+        rigs = self.rigs * 3
+        targets = [Point2(0.1 * i, 0.5) for i in xrange(6)]
+        # The same rig and target twice in one call.
+        rigs.append(rigs[0])
+        targets.append(targets[0])
+        solutions = cache.solve_all(rigs, targets)
+        for rig, target, solution in zip(rigs, targets, solutions):
+            self.assertTrue(_distance(rig.solve(target), solution) < 1e-12)
+
+    def test_quantized_hit(self):
+        first = self.cache.solve(self.rigs[0], Point2(1.2, 0.5))
+        second = self.cache.solve(self.rigs[0], Point2(1.2001, 0.5))
+        self.assertEqual(first, second)
+        self.assertTrue(first is not second)
+
+    def test_update_invalidates(self):
+        rig = self.rigs[0]
+        target = Point2(1.2, 0.5)
+        before = self.cache.solve(rig, target)
+        rig.update([Point2(0, 0), Point2(2, 0), Point2(2, 1)])
+        after = self.cache.solve(rig, target)
+        self.assertNotEqual(before, after)
+        self.assertTrue(_distance(rig.solve(target), after) < 1e-12)
+        self.assertAlmostEqual(abs(after[1] - after[0]), 2)
+
+if __name__ == '__main__':
+    unittest.main()
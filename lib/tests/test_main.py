@@ -0,0 +1,107 @@
+from euclid import *
+import unittest
+
+try:
+    import Box2D
+    import pyglet
+except ImportError:
+    Box2D = pyglet = None
+else:
+    from torn.geometry import *
+    from torn.main import *
+
+def _dispatch(window, *args):
+    # Dispatch at once rather than through the window's event queue.
+    pyglet.event.EventDispatcher.dispatch_event(window, *args)
+
+def _square(x, y, size):
+    return Polygon([Point2(x, y), Point2(x + size, y),
+                    Point2(x + size, y + size), Point2(x, y + size)])
+
+def _tear(game, line):
+    game.tear(line)
+    while game._tears or game._tearing is not None:
+        game.step(game.clock.time_step)
+
+@unittest.skipIf(Box2D is None or pyglet is None, 'needs Box2D and pyglet')
+class TearTest(unittest.TestCase):
+    def setUp(self):
+        self.level = Level()
+        self.level.polygons.append(_square(-1, -1, 2))
+        # Pinned to the ground left of the cut.
+        self.pin = Point2(-0.5, 0)
+        self.level.polygons.append(Polygon([self.pin]))
+        self.game = Game(self.level, scheduled=False)
+
+    def test_pieces(self):
+        _tear(self.game, LineSegment2(Point2(0, -2), Point2(0, 2)))
+        pieces = [polygon for _, polygon, _, _ in self.game._pieces]
+        self.assertEqual(len(pieces), 2)
+        self.assertAlmostEqual(sum(piece.area for piece in pieces), 4)
+
+    def test_joints(self):
+        _tear(self.game, LineSegment2(Point2(0, -2), Point2(0, 2)))
+        joints = list(self.game.world.jointList)
+        self.assertEqual(len(joints), 1)
+        for _ in xrange(60):
+            self.game.step(self.game.clock.time_step)
+        # The pinned piece hangs from the pin, and the other one falls.
+        for body, polygon, _, _ in self.game._pieces:
+            center = body.GetWorldCenter()
+            if polygon.bounds[0] < 0:
+                self.assertTrue(abs(Point2(center.x, center.y) -
+                                    self.pin) < 1)
+            else:
+                self.assertTrue(center.y < -1)
+
+    def test_joint_on_cut(self):
+        _tear(self.game, LineSegment2(Point2(-0.5, -2), Point2(-0.5, 2)))
+        self.assertEqual(len(list(self.game.world.jointList)), 2)
+
+@unittest.skipIf(Box2D is None or pyglet is None, 'needs Box2D and pyglet')
+class LayerTest(unittest.TestCase):
+    def setUp(self):
+        self.window = TornWindow(visible=False, width=400, height=400)
+        self.level = Level()
+        self.square = _square(-0.5, -0.5, 1)
+        self.level.polygons.append(self.square)
+        self.game_layer = GameLayer(self.window, self.level)
+        self.window.push_layer(self.game_layer)
+        self.window.push_layer(EditSkeletonLayer(self.window,
+                                                 self.game_layer))
+
+    def tearDown(self):
+        if self.game_layer.game is not None:
+            self.game_layer.game.delete()
+        self.window.close()
+
+    def drag(self, start, end):
+        camera = self.game_layer.camera
+        x1, y1 = camera.get_screen_point(start)
+        x2, y2 = camera.get_screen_point(end)
+        left = pyglet.window.mouse.LEFT
+        _dispatch(self.window, 'on_mouse_press', x1, y1, left, 0)
+        _dispatch(self.window, 'on_mouse_drag', x2, y2, x2 - x1, y2 - y1,
+                  left, 0)
+        _dispatch(self.window, 'on_mouse_release', x2, y2, left, 0)
+
+    def test_drag_vertex(self):
+        self.drag(Point2(0.5, 0.5), Point2(0.75, 0.5))
+        self.assertEqual(len(self.window.layers), 2)
+        self.assertTrue(abs(self.square.vertices[2] - Point2(0.75, 0.5)) <
+                        0.01)
+
+    def test_tear_after_editing(self):
+        # Drag layers from the editing session must not handle the mouse in
+        # play mode.
+        self.drag(Point2(0.5, 0.5), Point2(0.75, 0.5))
+        _dispatch(self.window, 'on_key_press', pyglet.window.key.ENTER, 0)
+        game = self.game_layer.game
+        self.drag(Point2(0, -1), Point2(0, 1))
+        self.assertEqual(len(game._tears), 1)
+        for _ in xrange(100):
+            game.step(game.clock.time_step)
+        self.assertEqual(len(game._pieces), 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,42 @@
+from __future__ import division
+
+import unittest
+
+from torn.timestep import *
+
+class FixedTimeStepTest(unittest.TestCase):
+    def test_steps(self):
+        clock = FixedTimeStep(0.25, max_steps=5)
+        self.assertEqual(clock.advance(0.1), 0)
+        self.assertEqual(clock.advance(0.2), 1)
+        self.assertAlmostEqual(clock.accumulator, 0.05)
+        self.assertEqual(clock.advance(0.7), 3)
+        self.assertAlmostEqual(clock.accumulator, 0)
+
+    def test_jitter(self):
+        # The same total time gives the same number of steps, however it is
+        # split into frames.
+        clock = FixedTimeStep(0.25, max_steps=5)
+        steps = sum(clock.advance(dt) for dt in (0.3, 0.05, 0.4, 0.25))
+        self.assertEqual(steps, 4)
+        self.assertAlmostEqual(clock.accumulator, 0)
+
+    def test_max_steps(self):
+        clock = FixedTimeStep(0.25, max_steps=5)
+        self.assertEqual(clock.advance(10), 5)
+        # The time that could not be caught up with is dropped.
+        self.assertAlmostEqual(clock.accumulator, 0.25)
+        self.assertEqual(clock.advance(0), 1)
+        self.assertEqual(clock.advance(0), 0)
+
+    def test_interpolate(self):
+        clock = FixedTimeStep(0.25, max_steps=5)
+        clock.advance(0.3125)
+        self.assertAlmostEqual(clock.alpha, 0.25)
+        x, y, angle = clock.interpolate((0, 4, 1), (4, 0, 1))
+        self.assertAlmostEqual(x, 1)
+        self.assertAlmostEqual(y, 3)
+        self.assertAlmostEqual(angle, 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,209 @@
+"""
+Microbenchmarks for the euclid operations used in per-frame code.
+
+  python -m torn.benchmark run [-o results.json] [-f pattern]
+  python -m torn.benchmark compare baseline.json results.json [-t 0.1]
+  python -m torn.benchmark memory
+
+compare exits with status 1 if any benchmark is slower than the baseline by
+more than the threshold, and memory if any object is larger than its target.
+"""
+
+from __future__ import division
+
+import euclid
+import gc
+import json
+from math import *
+from optparse import OptionParser
+import platform
+import random
+import sys
+import timeit
+from torn.geometry import Polygon
+import types
+
+_setup = """
+from euclid import Circle, LineSegment2, Matrix3, Matrix4, Point2, Point3, \
+                   Quaternion, Vector2, Vector2Array, Vector3, nearest_segment2
+import array
+a = Vector2(1.5, 2.5)
+b = Vector2(-0.5, 4.0)
+p = Point2(0.25, 0.75)
+m3 = Matrix3.new_translate(1, 2).rotate(0.5).scale(2, 3)
+n3 = Matrix3.new_rotate(-0.25)
+m4 = Matrix4.new_translate(1, 2, 3).rotatex(0.5).scale(2, 3, 4)
+n4 = Matrix4.new_rotate_axis(0.5, Vector3(1, 2, 3))
+p3 = Point3(1, 2, 3)
+q1 = Quaternion.new_rotate_axis(0.5, Vector3(1, 0, 0))
+q2 = Quaternion.new_rotate_axis(2.0, Vector3(0, 1, 1))
+c = Circle(Point2(0.5, 0.5), 1.0)
+s1 = LineSegment2(Point2(0, 0), Point2(2, 2))
+s2 = LineSegment2(Point2(0, 2), Point2(2, 0))
+coords = array.array('d', range(2000))
+segments = array.array('d', range(4000))
+va = Vector2Array.new_from_buffer(coords)
+"""
+
+benchmarks = [
+    ('vector2_add', 'a + b'),
+    ('vector2_mul', 'a * 2.5'),
+    ('vector2_abs', 'abs(a)'),
+    ('vector2_normalized', 'a.normalized()'),
+    ('vector2_swizzle', 'a.yx'),
+    ('vector2_add_scaled', 'a.add_scaled(b, 0.0)'),
+    ('matrix3_mul', 'm3 * n3'),
+    ('matrix3_mul_point2', 'm3 * p'),
+    ('matrix3_transform_points_1000', 'm3.transform_points(coords)'),
+    ('matrix4_mul', 'm4 * n4'),
+    ('matrix4_inverse', 'm4.inverse()'),
+    ('matrix4_transform', 'm4.transform(p3)'),
+    ('quaternion_interpolate', 'Quaternion.new_interpolate(q1, q2, 0.3)'),
+    ('circle_intersect_point2', 'c.intersect(p)'),
+    ('line_segment2_intersect', 's1.intersect(s2)'),
+    ('point2_connect_line_segment2', 'p.connect(s1)'),
+    ('vector2_array_add_1000', 'va + va'),
+    ('nearest_segment2_1000', 'nearest_segment2(p, segments)'),
+]
+
+# Name, expression creating the object and the target size in bytes,
+# including everything the object references.  Objects are measured in the
+# state they are in when used, with lazy properties computed.
+memory_benchmarks = [
+    ('point2', 'Point2(random(), random())', 112),
+    ('polygon_1000', 'used_polygon(1000)', 122000),
+]
+
+def used_polygon(vertex_count):
+    """
+    Return a simple polygon with the properties that the editor and the
+    game read from it already computed.  Only dragged polygons build their
+    vertices.
+    """
+    vertices = []
+    for i in xrange(vertex_count):
+        angle = 2 * pi * i / vertex_count
+        radius = 1 + random.random()
+        vertices.append(euclid.Point2(radius * cos(angle),
+                                      radius * sin(angle)))
+    polygon = Polygon(vertices)
+    polygon.segments
+    polygon.area
+    polygon.simple
+    polygon.triangle_indices
+    return polygon
+
+def time_statement(statement, setup=_setup, repeat=3, min_time=0.05):
+    """
+    Return the best time in seconds of one execution of statement.
+    """
+    timer = timeit.Timer(statement, setup)
+    number = 1
+    while timer.timeit(number) < min_time:
+        number *= 10
+    return min(timer.repeat(repeat, number)) / number
+
+def run(pattern=None, repeat=3):
+    results = {}
+    for name, statement in benchmarks:
+        if pattern is None or pattern in name:
+            results[name] = time_statement(statement, repeat=repeat)
+            print '%-36s %12.3f us' % (name, 1e6 * results[name])
+    return {'python': platform.python_version(),
+            'numpy': euclid.numpy is not None,
+            'results': results}
+
+def deep_size(obj):
+    """
+    Return the size in bytes of obj and all objects it references, other
+    than classes and modules.
+    """
+    seen = set()
+    size = 0
+    stack = [obj]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen or isinstance(obj, (type, types.ClassType,
+                                               types.ModuleType)):
+            continue
+        seen.add(id(obj))
+        size += sys.getsizeof(obj)
+        stack.extend(gc.get_referents(obj))
+    return size
+
+def measure_memory():
+    """
+    Return the names of the objects that are larger than their target.
+    """
+    namespace = {'used_polygon': used_polygon}
+    exec ('from euclid import Point2\n'
+          'from random import random\n') in namespace
+    failures = []
+    for name, expression, target in memory_benchmarks:
+        size = deep_size(eval(expression, namespace))
+        flag = ''
+        if size > target:
+            flag = 'OVER TARGET'
+            failures.append(name)
+        print '%-36s %9d bytes (target %d) %s' % (name, size, target, flag)
+    return failures
+
+def compare(baseline, current, threshold=0.1):
+    """
+    Return the names of the benchmarks in current that are more than
+    threshold slower than in baseline.
+    """
+    regressions = []
+    for name in sorted(current['results']):
+        if name not in baseline['results']:
+            print '%-36s %12s' % (name, 'new')
+            continue
+        ratio = current['results'][name] / baseline['results'][name]
+        flag = ''
+        if ratio > 1 + threshold:
+            flag = 'REGRESSION'
+            regressions.append(name)
+        print '%-36s %11.2fx %s' % (name, ratio, flag)
+    return regressions
+
+def load_results(path):
+    file_ = open(path)
+    try:
+        return json.load(file_)
+    finally:
+        file_.close()
+
+def save_results(results, path):
+    file_ = open(path, 'w')
+    try:
+        json.dump(results, file_, indent=2, sort_keys=True)
+    finally:
+        file_.close()
+
+def main(args=None):
+    parser = OptionParser(usage=__doc__.strip())
+    parser.add_option('-o', '--output', help='write results to OUTPUT')
+    parser.add_option('-f', '--filter',
+                      help='only run benchmarks whose name contains FILTER')
+    parser.add_option('-r', '--repeat', type='int', default=3)
+    parser.add_option('-t', '--threshold', type='float', default=0.1,
+                      help='allowed slowdown before flagging, default 0.1')
+    options, args = parser.parse_args(args)
+    if args == ['run']:
+        results = run(options.filter, options.repeat)
+        if options.output:
+            save_results(results, options.output)
+    elif args == ['memory']:
+        if measure_memory():
+            return 1
+    elif len(args) == 3 and args[0] == 'compare':
+        regressions = compare(load_results(args[1]), load_results(args[2]),
+                              options.threshold)
+        if regressions:
+            return 1
+    else:
+        parser.error('expected "run", "compare BASELINE CURRENT" or "memory"')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
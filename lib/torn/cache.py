@@ -0,0 +1,88 @@
+"""
+Process-wide cache of products derived from polygon content, such as
+triangulations and convex decompositions.
+
+Keys start with the content hash of the polygon, so that identical polygons
+share entries.  Only polygons marked as shared, such as those that become
+bodies, use the cache.  Values must not be modified.  The cache can be saved
+to disk and loaded in a later session, as long as its version has not
+changed.
+"""
+
+from collections import OrderedDict
+import cPickle as pickle
+import os
+
+__all__ = ['LRUCache', 'cache']
+
+class LRUCache(object):
+    """
+    Mapping that forgets the least recently used items beyond max_size.
+
+    The version is saved with the items, and files saved with another
+    version are not loaded.
+    """
+
+    def __init__(self, max_size=4096, version=0):
+        self.max_size = max_size
+        self.version = version
+        self._items = OrderedDict()
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def __getitem__(self, key):
+        # Move the item to the most recently used end.
+        value = self._items.pop(key)
+        self._items[key] = value
+        return value
+
+    def __setitem__(self, key, value):
+        self._items.pop(key, None)
+        self._items[key] = value
+        while len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def clear(self):
+        self._items.clear()
+
+    def load(self, path):
+        """
+        Add the items saved in path, if it exists and was saved with the
+        same version.
+        """
+        if not os.path.exists(path):
+            return
+        file_ = open(path, 'rb')
+        try:
+            state = pickle.load(file_)
+        finally:
+            file_.close()
+        # Files from before versions were saved hold a list of items.
+        if not isinstance(state, dict) or \
+           state.get('version') != self.version:
+            return
+        for key, value in state['items']:
+            self[key] = value
+
+    def save(self, path):
+        file_ = open(path, 'wb')
+        try:
+            pickle.dump({'version': self.version,
+                         'items': self._items.items()},
+                        file_, pickle.HIGHEST_PROTOCOL)
+        finally:
+            file_.close()
+
+# Bump the version when the products or the algorithms that compute them
+# change, so that products saved by an earlier version are discarded.
+cache = LRUCache(version=2)
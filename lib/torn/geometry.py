@@ -1,19 +1,579 @@
+import array
+from bisect import bisect_left, bisect_right
 from euclid import *
+import hashlib
+import heapq
 from itertools import*
 from math import *
+import torn.cache
 
-__all__ = ['Polygon']
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+__all__ = ['HashGrid', 'Polygon', 'mass_properties', 'weld_vertices']
+
+class _VertexList(list):
+    """
+    The list of Point2 returned by Polygon.vertices.  Changes to the list
+    are written back to the polygon.
+    """
+
+    def __init__(self, polygon, vertices):
+        list.__init__(self, vertices)
+        self._polygon = polygon
+
+    def _changed(self):
+        self._polygon.update()
+
+    def __setitem__(self, key, value):
+        list.__setitem__(self, key, value)
+        self._changed()
+
+    def __delitem__(self, key):
+        list.__delitem__(self, key)
+        self._changed()
+
+    def __setslice__(self, i, j, sequence):
+        list.__setslice__(self, i, j, sequence)
+        self._changed()
+
+    def __delslice__(self, i, j):
+        list.__delslice__(self, i, j)
+        self._changed()
+
+    def __iadd__(self, other):
+        list.__iadd__(self, other)
+        self._changed()
+        return self
+
+    def __imul__(self, other):
+        list.__imul__(self, other)
+        self._changed()
+        return self
+
+    def append(self, vertex):
+        list.append(self, vertex)
+        self._changed()
+
+    def extend(self, vertices):
+        list.extend(self, vertices)
+        self._changed()
+
+    def insert(self, i, vertex):
+        list.insert(self, i, vertex)
+        self._changed()
+
+    def pop(self, i=-1):
+        vertex = list.pop(self, i)
+        self._changed()
+        return vertex
+
+    def remove(self, vertex):
+        list.remove(self, vertex)
+        self._changed()
+
+    def reverse(self):
+        list.reverse(self)
+        self._changed()
+
+    def sort(self, *args, **kwargs):
+        list.sort(self, *args, **kwargs)
+        self._changed()
+
+def _crossing_x(edge, y):
+    # Exact at the end points, so that edges sharing a vertex agree.
+    x1, y1, x2, y2 = edge
+    if y == y2:
+        return x2
+    return min((y - y1) * (x2 - x1) / (y2 - y1) + x1, max(x1, x2))
+
+class _SlabIndex(object):
+    """
+    Point-in-polygon index.  The plane is cut into horizontal slabs at the
+    vertex y coordinates, and each slab lists the edges that span it.
+
+    If the edges do not cross, they are sorted from left to right in each
+    slab, and the crossings to the right of a point are found by binary
+    search.
+    """
+
+    def __init__(self, segments, ordered, spans=None):
+        if spans is None:
+            spans = _SlabIndex.spans(segments)
+        self.ys, spans = spans
+        self.slabs = slabs = [[] for _ in self.ys[1:]]
+        self.ordered = ordered
+        for i, start, stop in spans:
+            edge = tuple(segments[i:i + 4])
+            for k in xrange(start, stop):
+                slabs[k].append(edge)
+        if ordered:
+            ys = self.ys
+            for k, slab in enumerate(slabs):
+                y = (ys[k] + ys[k + 1]) / 2
+                slab.sort(key=lambda edge: _crossing_x(edge, y))
+
+    @staticmethod
+    def spans(segments):
+        """
+        Return the slab boundaries, and the offset in segments and the range
+        of slabs for each edge that is not horizontal.
+        """
+        ys = sorted(set(segments[1::2]))
+        spans = []
+        for i in xrange(0, len(segments), 4):
+            y1 = segments[i + 1]
+            y2 = segments[i + 3]
+            if y1 != y2:
+                spans.append((i, bisect_left(ys, min(y1, y2)),
+                              bisect_left(ys, max(y1, y2))))
+        return ys, spans
+
+    @staticmethod
+    def size(spans):
+        """
+        Return the number of slab entries for the given spans.
+        """
+        return sum(stop - start for _, start, stop in spans[1])
+
+    def crossings(self, x, y):
+        """
+        Return the number of edges crossed by a ray from (x, y) in the
+        positive x direction.
+        """
+        ys = self.ys
+        if not ys or y <= ys[0] or y > ys[-1]:
+            return 0
+        slab = self.slabs[bisect_left(ys, y) - 1]
+        if not self.ordered:
+            return sum(1 for edge in slab if x <= _crossing_x(edge, y))
+        lo = 0
+        hi = len(slab)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if x <= _crossing_x(slab[mid], y):
+                hi = mid
+            else:
+                lo = mid + 1
+        return len(slab) - lo
+
+    def crossings_array(self, X, Y):
+        """
+        Vectorized crossings for numpy arrays of x and y coordinates.  All
+        points are bisected together, so the index must be ordered.
+        """
+        assert self.ordered
+        counts = numpy.zeros(len(X), dtype=int)
+        edges = self._get_edge_array()
+        if not len(edges):
+            return counts
+        ys = self.ys
+        valid = (ys[0] < Y) & (Y <= ys[-1])
+        X = X[valid]
+        Y = Y[valid]
+        slabs = numpy.searchsorted(ys, Y) - 1
+        lo = self._offsets[slabs]
+        end = self._offsets[slabs + 1]
+        hi = end.copy()
+        active = lo < hi
+        while active.any():
+            mid = (lo + hi) // 2
+            x1, y1, x2, y2 = edges[numpy.minimum(mid, len(edges) - 1)].T
+            xcross = numpy.where(Y == y2, x2,
+                                 numpy.minimum((Y - y1) * (x2 - x1) /
+                                               (y2 - y1) + x1,
+                                               numpy.maximum(x1, x2)))
+            right = X <= xcross
+            hi = numpy.where(active & right, mid, hi)
+            lo = numpy.where(active & ~right, mid + 1, lo)
+            active = lo < hi
+        counts[valid] = end - lo
+        return counts
+
+    def _get_edge_array(self):
+        # The slabs as one edge array, with the start of each slab in
+        # _offsets.
+        try:
+            return self._edges
+        except AttributeError:
+            sizes = [0] + [len(slab) for slab in self.slabs]
+            self._offsets = numpy.cumsum(sizes)
+            self._edges = numpy.array(list(chain(*self.slabs)),
+                                      dtype=float).reshape(-1, 4)
+            return self._edges
+
+def _count_crossings(coords, x, y):
+    # Linear crossing test, for polygons without an index.
+    count = 0
+    x1, y1 = coords[-2:]
+    for i in xrange(0, len(coords), 2):
+        x2 = coords[i]
+        y2 = coords[i + 1]
+        if min(y1, y2) < y <= max(y1, y2) and x <= max(x1, x2) and y1 != y2:
+            if y == y2:
+                xcross = x2
+            else:
+                xcross = (y - y1) * (x2 - x1) / (y2 - y1) + x1
+            if x <= xcross:
+                count += 1
+        x1 = x2
+        y1 = y2
+    return count
+
+def _cross(xs, ys, a, b, c):
+    return ((xs[b] - xs[a]) * (ys[c] - ys[a]) -
+            (ys[b] - ys[a]) * (xs[c] - xs[a]))
+
+def _triangulate(coords):
+    # Ear clipping.  Returns counter-clockwise triangles as vertex index
+    # triples.
+    xs = coords[0::2]
+    ys = coords[1::2]
+    n = len(xs)
+    if n < 3:
+        return []
+    area = sum(xs[i - 1] * ys[i] - xs[i] * ys[i - 1] for i in xrange(n))
+    order = range(n)
+    if area < 0:
+        order.reverse()
+    next_ = dict(zip(order, order[1:] + order[:1]))
+    prev = dict(zip(order, order[-1:] + order[:-1]))
+    reflex = set(i for i in order
+                 if _cross(xs, ys, prev[i], i, next_[i]) <= 0)
+
+    # Only reflex vertices can be inside an ear.  Look them up by the
+    # bounds of the ear, in cells of about one vertex each.
+    size = max(max(xs) - min(xs), max(ys) - min(ys))
+    grid = HashGrid(size / sqrt(n) or 1)
+    for r in reflex:
+        grid.insert(r, (xs[r], ys[r], xs[r], ys[r]))
+
+    def is_ear(b):
+        a = prev[b]
+        c = next_[b]
+        if b in reflex:
+            return False
+        bounds = (min(xs[a], xs[b], xs[c]), min(ys[a], ys[b], ys[c]),
+                  max(xs[a], xs[b], xs[c]), max(ys[a], ys[b], ys[c]))
+        for r in grid.query(bounds):
+            if r in reflex and r != a and r != c and \
+               _cross(xs, ys, a, b, r) >= 0 and \
+               _cross(xs, ys, b, c, r) >= 0 and \
+               _cross(xs, ys, c, a, r) >= 0:
+                return False
+        return True
+
+    triangles = []
+    b = order[0]
+    misses = 0
+    while n > 3:
+        # If there is no ear, the polygon is not simple.  Clip anyway.
+        if is_ear(b) or misses > n:
+            a = prev[b]
+            c = next_[b]
+            triangles.append((a, b, c))
+            next_[a] = c
+            prev[c] = a
+            reflex.discard(b)
+            for i in (a, c):
+                if _cross(xs, ys, prev[i], i, next_[i]) > 0:
+                    reflex.discard(i)
+            n -= 1
+            misses = 0
+            b = c
+        else:
+            b = next_[b]
+            misses += 1
+    triangles.append((prev[b], b, next_[b]))
+    return triangles
+
+def _merge_convex(coords, triangles, max_vertices):
+    # Hertel-Mehlhorn.  Removes diagonals between counter-clockwise pieces
+    # while the merged piece stays strictly convex and small enough.
+    xs = coords[0::2]
+    ys = coords[1::2]
+    pieces = [list(triangle) for triangle in triangles]
+    owners = {}
+    for i, piece in enumerate(pieces):
+        for a, b in zip(piece, piece[1:] + piece[:1]):
+            owners[a, b] = i
+    diagonals = [(a, b) for a, b in sorted(owners) if (b, a) in owners]
+    for a, b in diagonals:
+        if (a, b) not in owners:
+            continue
+        i = owners[a, b]
+        j = owners[b, a]
+        p = pieces[i]
+        q = pieces[j]
+        if len(p) + len(q) - 2 > max_vertices:
+            continue
+
+        # Walk p from b to a, then q from a to b.
+        k = p.index(b)
+        p = p[k:] + p[:k]
+        k = q.index(a)
+        q = q[k:] + q[:k]
+        merged = p + q[1:-1]
+        if _cross(xs, ys, merged[-1], b, merged[1]) <= 0 or \
+           _cross(xs, ys, p[-2], a, q[1]) <= 0:
+            continue
+        pieces[i] = merged
+        pieces[j] = None
+        del owners[a, b]
+        del owners[b, a]
+        for edge in zip(q, q[1:] + q[:1]):
+            if edge in owners:
+                owners[edge] = i
+    return [piece for piece in pieces if piece is not None]
+
+def _split_loops(points):
+    # Split a ring of points into loops without repeated points.
+    loops = []
+    stack = []
+    positions = {}
+    for point in points:
+        if point in positions:
+            k = positions[point]
+            loops.append(stack[k:])
+            for other in stack[k + 1:]:
+                del positions[other]
+            del stack[k + 1:]
+        else:
+            positions[point] = len(stack)
+            stack.append(point)
+    loops.append(stack)
+    return loops
+
+def _segment_distance_squared(xs, ys, a, b, p):
+    # Squared distance from vertex p to the segment from vertex a to b.
+    dx = xs[b] - xs[a]
+    dy = ys[b] - ys[a]
+    px = xs[p] - xs[a]
+    py = ys[p] - ys[a]
+    dd = dx * dx + dy * dy
+    if dd != 0:
+        u = max(0, min(1, (px * dx + py * dy) / dd))
+        px -= u * dx
+        py -= u * dy
+    return px * px + py * py
+
+def _douglas_peucker(xs, ys, chain_, tolerance):
+    # Returns the vertices of chain_ to keep, including both ends.
+    keep = [False] * len(chain_)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(chain_) - 1)]
+    while stack:
+        i, j = stack.pop()
+        best = tolerance ** 2
+        index = None
+        for k in xrange(i + 1, j):
+            distance = _segment_distance_squared(xs, ys, chain_[i], chain_[j],
+                                                 chain_[k])
+            if distance > best:
+                best = distance
+                index = k
+        if index is not None:
+            keep[index] = True
+            stack.append((i, index))
+            stack.append((index, j))
+    return [v for v, kept in izip(chain_, keep) if kept]
+
+def _simplify_douglas_peucker(xs, ys, closed, tolerance):
+    n = len(xs)
+    if not closed:
+        return _douglas_peucker(xs, ys, range(n), tolerance)
+
+    # Split the ring at the vertex farthest from the first one.
+    far = max(xrange(n), key=lambda i: (xs[i] - xs[0]) ** 2 +
+                                       (ys[i] - ys[0]) ** 2)
+    if far == 0:
+        return [0]
+    chain1 = range(far + 1)
+    chain2 = range(far, n) + [0]
+    kept = (_douglas_peucker(xs, ys, chain1, tolerance)[:-1] +
+            _douglas_peucker(xs, ys, chain2, tolerance)[:-1])
+    if len(kept) < 3 <= n:
+        # Keep the polygon from collapsing into a line.
+        others = [i for i in xrange(n) if i != 0 and i != far]
+        kept.append(max(others, key=lambda i: _segment_distance_squared(
+            xs, ys, 0, far, i)))
+        kept.sort()
+    return kept
+
+def _simplify_visvalingam(xs, ys, closed, tolerance):
+    n = len(xs)
+    order = range(n)
+    next_ = order[1:] + order[:1]
+    prev = order[-1:] + order[:-1]
+    areas = [abs(_cross(xs, ys, prev[i], i, next_[i])) / 2 for i in order]
+    if not closed:
+        areas[0] = areas[-1] = float('inf')
+    heap = [(area, i) for i, area in enumerate(areas)]
+    heapq.heapify(heap)
+    removed = [False] * n
+    count = n
+    while heap and count > (closed and 3 or 2):
+        area, i = heapq.heappop(heap)
+        if removed[i] or area != areas[i]:
+            # Stale heap entry.
+            continue
+        if area >= tolerance:
+            break
+        removed[i] = True
+        count -= 1
+        a = prev[i]
+        c = next_[i]
+        next_[a] = c
+        prev[c] = a
+        for j in (a, c):
+            if areas[j] != float('inf'):
+                # Effective areas never decrease, so that removing a vertex
+                # cannot promote its neighbours.
+                areas[j] = max(area, abs(_cross(xs, ys, prev[j], j,
+                                                next_[j])) / 2)
+                heapq.heappush(heap, (areas[j], j))
+    return [i for i in order if not removed[i]]
 
 class Polygon(object):
+    """
+    A polygon stored as a flat array of vertex coordinates, x0, y0, x1, y1,
+    ...
+
+    Derived properties are cached until the polygon changes, which bumps
+    version.  Changes made through vertices are picked up automatically, but
+    after moving a vertex in place, e.g. with vertex[:] = point, update must
+    be called.
+    """
+
+    # Polygons with at least this many vertices use the index for intersect.
+    index_threshold = 32
+
+    # The index holds at most this many slab entries per vertex.  Polygons
+    # with many reflex vertices, such as stars, have edges spanning most
+    # slabs, and use the linear crossing test instead.
+    index_factor = 8
+
+    # Whether expensive products, such as triangles, are also kept in the
+    # process-wide cache under the content hash.  Set it on polygons that
+    # are used as they are, e.g. for bodies.  Changes clear it, since every
+    # edit would add entries.
+    shared = False
+
     def __init__(self, vertices, closed=True):
-        self.vertices = list(v.copy() for v in vertices)
-        assert len(self.vertices) >= 1
-        assert all(isinstance(v, Point2) for v in self.vertices)
+        vertices = list(vertices)
+        assert len(vertices) >= 1
+        assert all(isinstance(v, Point2) for v in vertices)
         assert type(closed) is bool
-        self.closed = closed
+        self._coords = array.array('d', chain(*vertices))
+        self._closed = closed
+        self._vertices = None
+        self._cache = {}
+        self.version = 0
 
     def copy(self):
-        return Polygon(self.vertices, self.closed)
+        return Polygon._new_coords(self._coords, self._closed)
+
+    def _new_coords(coords, closed):
+        polygon = Polygon.__new__(Polygon)
+        polygon._coords = array.array('d', coords)
+        polygon._closed = closed
+        polygon._vertices = None
+        polygon._cache = {}
+        polygon.version = 0
+        return polygon
+    _new_coords = staticmethod(_new_coords)
+
+    def __getstate__(self):
+        # Pickle the vertices as one flat array of coordinates.
+        return array.array('d', self.coords), self._closed
+
+    def __setstate__(self, state):
+        self._vertices = None
+        self._cache = {}
+        self.version = 0
+        if isinstance(state, dict):
+            self._closed = state['closed']
+            self.vertices = state['vertices']
+        else:
+            coords, self._closed = state
+            self._coords = array.array('d', coords)
+
+    def update(self):
+        """
+        Re-read the vertices after they have been changed in place, and
+        drop all cached properties.  The polygon is no longer shared.
+        """
+        if self._vertices is not None:
+            self._coords = array.array('d', chain(*self._vertices))
+        self.version += 1
+        self._cache.clear()
+        self.shared = False
+
+    def _cached(self, key, function, shared=False):
+        # Shared values must not be modified.  If the polygon is shared, they
+        # are also kept in the process-wide cache, under the content hash.
+        # Changing how they are computed needs a new cache version.
+        try:
+            return self._cache[key]
+        except KeyError:
+            pass
+        if shared and self.shared:
+            shared_key = self.content_hash, key
+            value = torn.cache.cache.get(shared_key)
+            if value is None:
+                value = torn.cache.cache[shared_key] = function()
+        else:
+            value = function()
+        self._cache[key] = value
+        return value
+
+    @property
+    def content_hash(self):
+        """
+        SHA-1 hex digest of the coordinates and closed flag.  Polygons with
+        the same content have the same hash.
+        """
+        return self._cached('content_hash', self._get_content_hash)
+
+    def _get_content_hash(self):
+        content = hashlib.sha1(self._coords.tostring())
+        content.update(self._closed and 'closed' or 'open')
+        return content.hexdigest()
+
+    def _get_coords(self):
+        return self._coords
+
+    coords = property(_get_coords, doc="""
+        The flat array of vertex coordinates.  It must not be modified.
+        """)
+
+    def _get_vertices(self):
+        if self._vertices is None:
+            coords = self._coords
+            self._vertices = _VertexList(self, [Point2(coords[i],
+                                                       coords[i + 1])
+                                                for i in xrange(0,
+                                                                len(coords),
+                                                                2)])
+        return self._vertices
+
+    def _set_vertices(self, vertices):
+        self._vertices = _VertexList(self, vertices)
+        self.update()
+
+    vertices = property(_get_vertices, _set_vertices)
+
+    def _get_closed(self):
+        return self._closed
+
+    def _set_closed(self, closed):
+        assert type(closed) is bool
+        self._closed = closed
+        self.update()
+
+    closed = property(_get_closed, _set_closed)
 
     @property
     def edges(self):
@@ -22,22 +582,341 @@ class Polygon(object):
         else:
             return izip(self.vertices[:-1], self.vertices[1:])
 
+    @property
+    def segments(self):
+        """
+        Flat array of edge coordinates, x1, y1, x2, y2, ...
+        """
+        return self._cached('segments', self._get_segments)
+
+    def _get_segments(self):
+        coords = self._coords
+        segments = array.array('d')
+        for i in xrange(0, len(coords) - 2, 2):
+            segments.extend(coords[i:i + 4])
+        if self.closed:
+            segments.extend(coords[-2:])
+            segments.extend(coords[:2])
+        return segments
+
     @property
     def area(self):
         """
         http://local.wasp.uwa.edu.au/~pbourke/geometry/clockwise/
         """
-        if self.closed:
-            return sum(v1.x * v2.y - v2.x * v1.y for v1, v2 in self.edges) / 2
-        else:
+        return self._cached('area', self._get_area)
+
+    def _get_area(self):
+        if not self.closed:
             return 0
+        coords = self._coords
+        x1, y1 = coords[-2:]
+        area = 0.
+        for i in xrange(0, len(coords), 2):
+            x2 = coords[i]
+            y2 = coords[i + 1]
+            area += x1 * y2 - x2 * y1
+            x1 = x2
+            y1 = y2
+        return area / 2
 
     @property
     def clockwise(self):
         return self.area < 0
 
+    @property
+    def centroid(self):
+        """
+        http://local.wasp.uwa.edu.au/~pbourke/geometry/polyarea/
+        """
+        return self._cached('centroid', self._get_centroid).copy()
+
+    def _get_centroid(self):
+        coords = self._coords
+        area = self.area
+        if area == 0:
+            # Degenerate or open, use the average vertex.
+            count = len(coords) // 2
+            return Point2(sum(coords[0::2]) / count,
+                          sum(coords[1::2]) / count)
+        x1, y1 = coords[-2:]
+        cx = cy = 0.
+        for i in xrange(0, len(coords), 2):
+            x2 = coords[i]
+            y2 = coords[i + 1]
+            cross = x1 * y2 - x2 * y1
+            cx += (x1 + x2) * cross
+            cy += (y1 + y2) * cross
+            x1 = x2
+            y1 = y2
+        return Point2(cx / (6 * area), cy / (6 * area))
+
+    @property
+    def bounds(self):
+        """
+        The bounding box as a tuple (min_x, min_y, max_x, max_y).
+        """
+        return self._cached('bounds', self._get_bounds)
+
+    def _get_bounds(self):
+        xs = self._coords[0::2]
+        ys = self._coords[1::2]
+        return min(xs), min(ys), max(xs), max(ys)
+
     def reverse(self):
-        self.vertices.reverse()
+        coords = self._coords
+        reversed_coords = array.array('d', coords)
+        reversed_coords[0::2] = coords[-2::-2]
+        reversed_coords[1::2] = coords[::-2]
+        self._coords = reversed_coords
+        if self._vertices is not None:
+            list.reverse(self._vertices)
+        self.version += 1
+        self._cache.clear()
+
+    def self_intersections(self):
+        """
+        Return the index pairs of edges that intersect, other than
+        neighbouring edges meeting at their shared vertex.
+        """
+        segments = self.segments
+        count = len(segments) // 4
+        pairs = []
+        for i, j in intersect_segments2(segments):
+            if j == i + 1 or (self.closed and i == 0 and j == count - 1):
+                # Neighbours only count if they fold back over each other.
+                if j != i + 1:
+                    i, j = j, i
+                x1, y1, x2, y2 = segments[4 * i:4 * i + 4]
+                x3, y3 = segments[4 * j + 2:4 * j + 4]
+                u1 = Vector2(x2 - x1, y2 - y1)
+                u2 = Vector2(x3 - x2, y3 - y2)
+                if u1.x * u2.y - u2.x * u1.y != 0 or u1.dot(u2) >= 0:
+                    continue
+                i, j = min(i, j), max(i, j)
+            pairs.append((i, j))
+        return pairs
+
+    @property
+    def simple(self):
+        return self._cached('simple', lambda: not self.self_intersections(),
+                            shared=True)
+
+    @property
+    def triangles(self):
+        """
+        Counter-clockwise triangles covering the polygon, as vertex index
+        triples.  They are built from triangle_indices on every access.
+        """
+        indices = self.triangle_indices
+        return tuple(izip(indices[0::3], indices[1::3], indices[2::3]))
+
+    @property
+    def triangle_indices(self):
+        """
+        The triangles as a flat array of vertex indices, for indexed
+        drawing with GL_TRIANGLES.  It must not be modified.
+        """
+        return self._cached('triangle_indices', self._get_triangle_indices,
+                            shared=True)
+
+    def _get_triangle_indices(self):
+        if not self.closed:
+            return array.array('I')
+        return array.array('I', chain(*_triangulate(self._coords)))
+
+    def convex_decomposition(self, max_vertices=8):
+        """
+        Return convex pieces covering the polygon, with at most
+        max_vertices vertices each.  A piece is a tuple of counter-clockwise
+        (x, y) tuples, so that it can be passed to b2PolygonDef.
+
+        http://www.cs.ubc.ca/~snoeyink/papers/HM83.pdf
+        """
+        key = 'convex_decomposition', max_vertices
+        return self._cached(key, lambda: self._get_convex_decomposition(
+            max_vertices), shared=True)
+
+    def _get_convex_decomposition(self, max_vertices):
+        assert max_vertices >= 3
+        coords = self._coords
+        xs = coords[0::2]
+        ys = coords[1::2]
+        result = []
+        for piece in _merge_convex(coords, self.triangles, max_vertices):
+            # Skip pieces left over from collinear vertices.
+            if sum(_cross(xs, ys, piece[0], piece[i], piece[i + 1])
+                   for i in xrange(1, len(piece) - 1)) > 0:
+                result.append(tuple((xs[i], ys[i]) for i in piece))
+        return tuple(result)
+
+    def simplified(self, tolerance, method='douglas_peucker'):
+        """
+        Return a simplified copy of the polygon.
+
+        With method 'douglas_peucker', no removed vertex is farther than
+        tolerance from the simplified outline.  With 'visvalingam',
+        vertices are removed while the triangle they form with their
+        neighbours has less area than tolerance.
+        """
+        key = 'simplified', method, tolerance
+        indices = self._cached(key, lambda: self._simplify(tolerance, method),
+                               shared=True)
+        coords = self._coords
+        return Polygon._new_coords(chain(*((coords[2 * i], coords[2 * i + 1])
+                                          for i in indices)), self._closed)
+
+    def _simplify(self, tolerance, method):
+        xs = self._coords[0::2]
+        ys = self._coords[1::2]
+        if method == 'douglas_peucker':
+            indices = _simplify_douglas_peucker(xs, ys, self._closed,
+                                                tolerance)
+        elif method == 'visvalingam':
+            indices = _simplify_visvalingam(xs, ys, self._closed, tolerance)
+        else:
+            raise ValueError('unknown simplification method %r' % method)
+        return tuple(indices)
+
+    def get_level_of_detail(self, tolerance):
+        """
+        Return a Douglas-Peucker copy of the polygon within tolerance, e.g.
+        half a pixel in world units, or the polygon itself.
+
+        Tolerances are rounded down to a quarter of the polygon size divided
+        by a power of two, and each of these levels is built when it is
+        first asked for.
+        """
+        min_x, min_y, max_x, max_y = self.bounds
+        size = max(max_x - min_x, max_y - min_y)
+        if size == 0 or tolerance <= size * 2 ** -20:
+            return self
+        level = max(0, int(ceil(log(size / (4 * tolerance), 2))))
+        polygon = self._cached(('level_of_detail', level),
+                               lambda: self._get_level_of_detail(
+                                   size / 4 / 2 ** level))
+        if polygon is None:
+            return self
+        return polygon
+
+    def _get_level_of_detail(self, tolerance):
+        # None if no vertex is removed.
+        polygon = self.simplified(tolerance)
+        if len(polygon.coords) == len(self._coords):
+            return None
+        return polygon
+
+    def split(self, line):
+        """
+        Cut the polygon along line, which can be a Line2, a Ray2 or a
+        LineSegment2, and return the pieces as new polygons.  Only cuts
+        that go all the way through the polygon separate pieces.  Where a
+        piece would touch itself on the line, e.g. when the line runs along
+        an edge or through a notch, it is separated into several pieces.
+
+        The polygon must be closed and simple.
+        """
+        assert isinstance(line, Line2)
+        assert self.closed
+        coords = self._coords
+        px, py = line.p
+        vx, vy = line.v
+        vv = vx * vx + vy * vy
+        n = len(coords) // 2
+
+        # Side of each vertex.  Vertices on the line count as being to the
+        # left, so that every crossing is between two vertices.
+        sides = [vx * (coords[2 * i + 1] - py) - vy * (coords[2 * i] - px)
+                 for i in xrange(n)]
+        crossings = []
+        for i in xrange(n):
+            j = (i + 1) % n
+            if (sides[i] >= 0) != (sides[j] >= 0):
+                s = sides[i] / (sides[i] - sides[j])
+                x = coords[2 * i] + s * (coords[2 * j] - coords[2 * i])
+                y = coords[2 * i + 1] + s * (coords[2 * j + 1] -
+                                             coords[2 * i + 1])
+                u = ((x - px) * vx + (y - py) * vy) / vv
+                crossings.append((u, i, x, y))
+
+        # Along the line, the polygon is entered and left alternately, so
+        # the cuts connect consecutive pairs of crossings.
+        crossings.sort()
+        cuts = {}
+        for k in xrange(0, len(crossings) - 1, 2):
+            u1, i1, x1, y1 = crossings[k]
+            u2, i2, x2, y2 = crossings[k + 1]
+            if line._u_in(u1) and line._u_in(u2):
+                cuts[i1] = (x1, y1), i2, (x2, y2)
+                cuts[i2] = (x2, y2), i1, (x1, y1)
+        if not cuts:
+            return [self.copy()]
+
+        # The points on the line, by their position along it.
+        on_line = dict(((x, y), u) for u, _, x, y in crossings)
+        for i in xrange(n):
+            if sides[i] == 0:
+                x = coords[2 * i]
+                y = coords[2 * i + 1]
+                on_line[x, y] = ((x - px) * vx + (y - py) * vy) / vv
+        line_points = sorted((u, point) for point, u in on_line.iteritems())
+        line_us = [u for u, _ in line_points]
+
+        # Walk the boundary, following each cut to the other side.
+        pieces = []
+        visited = [False] * n
+        for start in xrange(n):
+            if visited[start]:
+                continue
+            piece = []
+            i = start
+            while not visited[i]:
+                visited[i] = True
+                piece.append((coords[2 * i], coords[2 * i + 1]))
+                if i in cuts:
+                    point1, i, point2 = cuts[i]
+                    piece.append(point1)
+                    piece.append(point2)
+                i = (i + 1) % n
+
+            # Edges along the line can pass over points on the line where
+            # the piece touches itself, e.g. when the line runs along a
+            # collinear edge or through a notch.  Add those points, and
+            # separate the piece into loops where they repeat.
+            ring = []
+            for point1, point2 in izip(piece, piece[1:] + piece[:1]):
+                ring.append(point1)
+                if point1 in on_line and point2 in on_line:
+                    u1 = on_line[point1]
+                    u2 = on_line[point2]
+                    k1 = bisect_right(line_us, min(u1, u2))
+                    k2 = bisect_left(line_us, max(u1, u2))
+                    between = [point for _, point in line_points[k1:k2]]
+                    if u1 > u2:
+                        between.reverse()
+                    ring.extend(between)
+            for loop in _split_loops([k for k, _ in groupby(ring)]):
+                if len(loop) >= 3:
+                    loop = Polygon._new_coords(chain(*loop), True)
+                    # Spikes and bridges of zero width have no area.
+                    if loop.area * self.area > 0:
+                        pieces.append(loop)
+        return pieces
+
+    @property
+    def index(self):
+        """
+        The point-in-polygon index, built on first use, or None if it would
+        be too large.
+        """
+        return self._cached('index', self._get_index)
+
+    def _get_index(self):
+        segments = self.segments
+        spans = _SlabIndex.spans(segments)
+        if _SlabIndex.size(spans) > self.index_factor * len(segments) // 4:
+            return None
+        return _SlabIndex(segments, self.simple, spans)
 
     def intersect(self, other):
         """
@@ -46,12 +925,162 @@ class Polygon(object):
         assert isinstance(other, Point2)
         if not self.closed:
             return False
-        count = 0
-        x, y = other
-        for v1, v2 in self.edges:
-            x1, y1 = v1
-            x2, y2 = v2
-            if min(y1, y2) < y <= max(y1, y2) and x <= max(x1, x2) and y1 != y2:
-                if x1 == x2 or x <= (y - y1) * (x2 - x1) / (y2 - y1) + x1:
+        if len(self._coords) >= 2 * self.index_threshold:
+            index = self.index
+            if index is not None:
+                return index.crossings(other.x, other.y) % 2 != 0
+        return _count_crossings(self._coords, other.x, other.y) % 2 != 0
+
+    def intersect_points(self, points):
+        """
+        Return the indices of the points in the flat buffer points that are
+        inside the polygon.
+        """
+        if not self.closed:
+            return []
+        index = self.index
+        if numpy is not None:
+            if not self.simple or index is None:
+                return points_in_polygon2(self.segments, points)
+            if isinstance(points, array.array):
+                points = numpy.frombuffer(points, dtype=float)
+            points = numpy.asarray(points, dtype=float).reshape(-1, 2)
+            counts = index.crossings_array(points[:, 0], points[:, 1])
+            return numpy.flatnonzero(counts % 2).tolist()
+        if index is None:
+            coords = self._coords
+            return [i // 2 for i in xrange(0, len(points), 2)
+                    if _count_crossings(coords, points[i],
+                                        points[i + 1]) % 2 != 0]
+        crossings = index.crossings
+        return [i // 2 for i in xrange(0, len(points), 2)
+                if crossings(points[i], points[i + 1]) % 2 != 0]
+
+def mass_properties(polygons, density=1):
+    """
+    Return the mass, center of mass and rotational inertia about the center
+    of mass of each polygon, as (mass, (x, y), inertia) tuples.  The
+    polygons must be closed and have at least three vertices.
+
+    The sums over the edges of all polygons are computed in one pass.
+    """
+    polygons = list(polygons)
+    assert all(p.closed and len(p.coords) >= 6 for p in polygons)
+    if numpy is not None and polygons:
+        S = numpy.concatenate([numpy.frombuffer(p.segments, dtype=float)
+                               for p in polygons]).reshape(-1, 4)
+        starts = numpy.cumsum([0] + [len(p.segments) // 4
+                                     for p in polygons[:-1]])
+        x1, y1, x2, y2 = S.T
+        cross = x1 * y2 - x2 * y1
+        sums = [numpy.add.reduceat(terms, starts).tolist()
+                for terms in (cross, (x1 + x2) * cross, (y1 + y2) * cross,
+                              (x1 * x1 + x1 * x2 + x2 * x2 +
+                               y1 * y1 + y1 * y2 + y2 * y2) * cross)]
+    else:
+        sums = [[], [], [], []]
+        for polygon in polygons:
+            segments = polygon.segments
+            a = sx = sy = si = 0.
+            for i in xrange(0, len(segments), 4):
+                x1, y1, x2, y2 = segments[i:i + 4]
+                cross = x1 * y2 - x2 * y1
+                a += cross
+                sx += (x1 + x2) * cross
+                sy += (y1 + y2) * cross
+                si += (x1 * x1 + x1 * x2 + x2 * x2 +
+                       y1 * y1 + y1 * y2 + y2 * y2) * cross
+            for values, value in izip(sums, (a, sx, sy, si)):
+                values.append(value)
+    result = []
+    for a, sx, sy, si in izip(*sums):
+        if a == 0:
+            result.append((0., (0., 0.), 0.))
+            continue
+        cx = sx / (3 * a)
+        cy = sy / (3 * a)
+        mass = density * abs(a) / 2
+        # Clockwise polygons have negative sums.
+        inertia = density * abs(si) / 12 - mass * (cx * cx + cy * cy)
+        result.append((mass, (cx, cy), inertia))
+    return result
+
+class HashGrid(object):
+    """
+    Spatial hash of items by their bounds, (min_x, min_y, max_x, max_y), in
+    square cells.  Queries return candidates that the caller checks exactly.
+    """
+
+    def __init__(self, cell_size):
+        assert cell_size > 0
+        self.cell_size = cell_size
+        self._cells = {}
+
+    def _get_cells(self, bounds):
+        min_x, min_y, max_x, max_y = bounds
+        size = self.cell_size
+        for i in xrange(int(floor(min_x / size)),
+                        int(floor(max_x / size)) + 1):
+            for j in xrange(int(floor(min_y / size)),
+                            int(floor(max_y / size)) + 1):
+                yield i, j
+
+    def insert(self, item, bounds):
+        for cell in self._get_cells(bounds):
+            self._cells.setdefault(cell, []).append(item)
+
+    def query(self, bounds):
+        """
+        Return the items in the cells that bounds overlaps.
+        """
+        items = []
+        seen = set()
+        for cell in self._get_cells(bounds):
+            for item in self._cells.get(cell, ()):
+                if id(item) not in seen:
+                    seen.add(id(item))
+                    items.append(item)
+        return items
+
+    def query_point(self, point, radius):
+        """
+        Return the point items within radius of point, nearest first.
+        """
+        x, y = point
+        candidates = self.query((x - radius, y - radius,
+                                 x + radius, y + radius))
+        points = [(abs(p - point), p) for p in candidates]
+        points = [(d, p) for d, p in points if d <= radius]
+        points.sort(key=lambda item: item[0])
+        return [p for d, p in points]
+
+def weld_vertices(polygons, epsilon, fixed=()):
+    """
+    Move each vertex within epsilon of an earlier vertex, or of a vertex of
+    the fixed polygons, onto that vertex, then remove repeated vertices.
+    Return the number of vertices moved.
+    """
+    grid = HashGrid(epsilon)
+    for polygon in fixed:
+        coords = polygon.coords
+        for i in xrange(0, len(coords), 2):
+            x = coords[i]
+            y = coords[i + 1]
+            grid.insert(Point2(x, y), (x, y, x, y))
+    count = 0
+    for polygon in polygons:
+        vertices = polygon.vertices
+        welded = False
+        for vertex in vertices:
+            nearest = grid.query_point(vertex, epsilon)
+            if nearest:
+                if nearest[0] != vertex:
+                    vertex[:] = nearest[0]
                     count += 1
-        return count % 2 != 0
+                welded = True
+            else:
+                grid.insert(vertex.copy(), (vertex.x, vertex.y,
+                                            vertex.x, vertex.y))
+        if welded:
+            polygon.vertices = [k for k, _ in groupby(vertices)]
+    return count
@@ -0,0 +1,90 @@
+"""
+Step a game without a window, as fast as possible, and report physics
+throughput.
+
+  python -m torn.headless [-n steps] [-l level.pickle] [-c columns] [-r rows]
+
+Without a level file, a floor pinned to the ground with a grid of boxes
+above it is used.
+"""
+
+from __future__ import division
+
+import cPickle as pickle
+from optparse import OptionParser
+import sys
+import timeit
+
+import pyglet
+# Do not open the hidden window that pyglet.gl creates for sharing contexts.
+pyglet.options['shadow_window'] = False
+
+from euclid import *
+from torn.geometry import *
+from torn.main import Game, Level
+
+def create_level(columns=10, rows=10):
+    """
+    Return a level with a floor and a grid of columns by rows boxes.
+    """
+    level = Level()
+    width = 1.2 * columns
+    level.polygons.append(Polygon([Point2(-width, -1), Point2(width, -1),
+                                   Point2(width, -0.8),
+                                   Point2(-width, -0.8)]))
+
+    # Pin the floor to the ground at both ends.
+    level.polygons.append(Polygon([Point2(-width + 0.1, -0.9)]))
+    level.polygons.append(Polygon([Point2(width - 0.1, -0.9)]))
+    for i in xrange(columns):
+        for j in xrange(rows):
+            x = 1.2 * (i - columns / 2)
+            y = 1.2 * j
+            level.polygons.append(Polygon([Point2(x, y), Point2(x + 1, y),
+                                           Point2(x + 1, y + 1),
+                                           Point2(x, y + 1)]))
+    return level
+
+def load_level(path):
+    file_ = open(path, 'rb')
+    try:
+        return pickle.load(file_)
+    finally:
+        file_.close()
+
+def run(level, steps=1000, dt=1 / 60):
+    """
+    Step a game for level and return a dict with steps per second and the
+    final body and contact counts.
+    """
+    game = Game(level, scheduled=False)
+    start = timeit.default_timer()
+    for _ in xrange(steps):
+        game.step(dt)
+    duration = timeit.default_timer() - start
+    return {'steps': steps,
+            'steps_per_second': steps / duration,
+            'bodies': game.world.GetBodyCount(),
+            'contacts': game.world.GetContactCount()}
+
+def main(args=None):
+    parser = OptionParser(usage=__doc__.strip())
+    parser.add_option('-n', '--steps', type='int', default=1000)
+    parser.add_option('-l', '--level', help='load the level from LEVEL')
+    parser.add_option('-c', '--columns', type='int', default=10)
+    parser.add_option('-r', '--rows', type='int', default=10)
+    options, args = parser.parse_args(args)
+    if args:
+        parser.error('unexpected arguments')
+    if options.level:
+        level = load_level(options.level)
+    else:
+        level = create_level(options.columns, options.rows)
+    result = run(level, options.steps)
+    print '%d steps, %.1f steps/s, %d bodies, %d contacts' % (
+        result['steps'], result['steps_per_second'], result['bodies'],
+        result['contacts'])
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
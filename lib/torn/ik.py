@@ -1,13 +1,28 @@
 from euclid import *
+from itertools import *
 from math import *
+from torn.cache import LRUCache
 
-__all__ = ['solve']
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
-def solve(vertices, target):
+__all__ = ['LimbRig', 'SolveCache', 'solve', 'solve_batch', 'solve_fabrik',
+           'solve_rigs']
+
+# Scratch vectors, reused between calls to avoid allocating temporaries.
+_u = Vector2()
+_u1 = Vector2()
+_u2 = Vector2()
+
+def solve(vertices, target, previous=None):
     if len(vertices) == 2:
         return solve_one_edge(vertices, target)
     elif len(vertices) == 3:
         return solve_two_edges(vertices, target)
+    elif len(vertices) > 3:
+        return solve_fabrik(vertices, target, previous)
     else:
         return vertices
 
@@ -15,27 +30,29 @@ def solve_one_edge(vertices, target):
     v1, v2 = vertices
     if v1 == target:
         return vertices
-    return v1, v1 + abs(v2 - v1) * (target - v1).normalize()
+    d1 = abs(v2.sub_into(v1, _u1))
+    target.sub_into(v1, _u).normalize()
+    return v1, v1.copy().add_scaled(_u, d1)
 
 def solve_two_edges(vertices, target):
     v1, v2, v3 = vertices
-    u = target - v1
+    u = target.sub_into(v1, _u)
     d = abs(u)
-    u1 = v2 - v1
-    u2 = v3 - v2
+    u1 = v2.sub_into(v1, _u1)
+    u2 = v3.sub_into(v2, _u2)
     d1 = abs(u1)
     d2 = abs(u2)
     if d == 0:
-        v3 = v2 - (d2 / d1) * u1
+        v3 = v2.copy().add_scaled(u1, -d2 / d1)
     elif d >= d1 + d2:
-        v2 = v1 + (d1 / d) * u
-        v3 = v2 + (d2 / d) * u
+        v2 = v1.copy().add_scaled(u, d1 / d)
+        v3 = v2.copy().add_scaled(u, d2 / d)
     elif d <= d1 - d2:
-        v2 = v1 + (d1 / d) * u
-        v3 = v2 - (d2 / d) * u
+        v2 = v1.copy().add_scaled(u, d1 / d)
+        v3 = v2.copy().add_scaled(u, -d2 / d)
     elif d <= d2 - d1:
-        v2 = v1 - (d1 / d) * u
-        v3 = v2 + (d2 / d) * u
+        v2 = v1.copy().add_scaled(u, -d1 / d)
+        v3 = v2.copy().add_scaled(u, d2 / d)
     else:
         # Closed form solution 2 from "Oh My God, I Inverted Kine!" by
         # Jeff Lander.
@@ -51,6 +68,449 @@ def solve_two_edges(vertices, target):
         else:
             a = a1 - a2
 
-        v2 = v1 + d1 * Vector2(cos(a), sin(a))
+        v2 = v1.copy()
+        v2.x += d1 * cos(a)
+        v2.y += d1 * sin(a)
         v3 = target
     return v1, v2, v3
+
+def solve_fabrik(vertices, target, previous=None, tolerance=1e-4,
+                 max_iterations=10):
+    """
+    Solve a chain of any length with FABRIK, keeping the edge lengths of
+    vertices and the first vertex in place.
+
+    The iterations start from previous, e.g. the solution of the last frame,
+    if given.  They stop when the last vertex is within tolerance of the
+    target, or after max_iterations.
+
+    http://www.andreasaristidou.com/FABRIK.html
+    """
+    lengths = _get_lengths(vertices)
+    if previous is not None:
+        assert len(previous) == len(vertices)
+    else:
+        previous = vertices
+    return _fabrik(previous, vertices[0], lengths, target, tolerance,
+                   max_iterations)
+
+def _get_lengths(vertices):
+    return [abs(v2 - v1) for v1, v2 in zip(vertices[:-1], vertices[1:])]
+
+def _fabrik(start, root, lengths, target, tolerance, max_iterations):
+    xs = [0.0] * len(start)
+    ys = [0.0] * len(start)
+    _fabrik_into(start, root, lengths, target, tolerance, max_iterations, xs,
+                 ys)
+    return tuple(Point2(x, y) for x, y in zip(xs, ys))
+
+def _fabrik_into(start, root, lengths, target, tolerance, max_iterations, xs,
+                 ys):
+    # FABRIK on the coordinate lists xs and ys, which must be as long as
+    # start.
+    n = len(start)
+    for i, v in enumerate(start):
+        xs[i] = v.x
+        ys[i] = v.y
+    root_x = root.x
+    root_y = root.y
+    tx = target.x
+    ty = target.y
+    if (tx - root_x) ** 2 + (ty - root_y) ** 2 >= sum(lengths) ** 2:
+        # Out of reach, stretch towards the target.
+        xs[0] = root_x
+        ys[0] = root_y
+        for i in xrange(n - 1):
+            xs[i + 1] = tx
+            ys[i + 1] = ty
+            _place(xs, ys, lengths, i, i + 1)
+    else:
+        for _ in xrange(max_iterations):
+            if (xs[-1] - tx) ** 2 + (ys[-1] - ty) ** 2 <= tolerance ** 2:
+                break
+            xs[-1] = tx
+            ys[-1] = ty
+            for i in xrange(n - 1, 0, -1):
+                _place(xs, ys, lengths, i, i - 1)
+            xs[0] = root_x
+            ys[0] = root_y
+            for i in xrange(n - 1):
+                _place(xs, ys, lengths, i, i + 1)
+
+def _place(xs, ys, lengths, i, j):
+    # Move vertex j along the line from vertex i, to its edge length.
+    dx = xs[j] - xs[i]
+    dy = ys[j] - ys[i]
+    d = sqrt(dx * dx + dy * dy)
+    if d != 0:
+        length = lengths[min(i, j)]
+        xs[j] = xs[i] + dx * length / d
+        ys[j] = ys[i] + dy * length / d
+
+class LimbRig(object):
+    """
+    A limb prepared for solving.  The edge lengths and winding of the rest
+    pose are computed once, and two edges are solved without trigonometry.
+    Use solve_into to solve without allocating vertices.
+    """
+
+    def __init__(self, vertices):
+        self.version = 0
+        self.update(vertices)
+
+    def update(self, vertices):
+        """
+        Rebuild the rig for a changed limb.  Bumps version, so that cached
+        solutions are no longer used.
+        """
+        self.vertices = tuple(v.copy() for v in vertices)
+        self.lengths = tuple(_get_lengths(self.vertices))
+        self.clockwise = False
+        if len(self.vertices) == 3:
+            v1, v2, v3 = self.vertices
+            self.clockwise = ((v2.x - v1.x) * (v3.y - v2.y) -
+                              (v3.x - v2.x) * (v2.y - v1.y)) < 0
+        # The rest coordinates, lengths and winding in one flat tuple, for
+        # solving many rigs together.
+        self.row = tuple(chain(*self.vertices)) + self.lengths + \
+                   (float(self.clockwise),)
+        # Scratch coordinates for solving.
+        self._xs = [0.0] * len(self.vertices)
+        self._ys = [0.0] * len(self.vertices)
+        self.version += 1
+
+    def solve(self, target, previous=None, tolerance=1e-4,
+              max_iterations=10):
+        """
+        Return the solved vertices, like solve(self.vertices, target,
+        previous).
+        """
+        self._solve(target, previous, tolerance, max_iterations)
+        return tuple(Point2(x, y) for x, y in izip(self._xs, self._ys))
+
+    def solve_into(self, target, out, previous=None, tolerance=1e-4,
+                   max_iterations=10):
+        """
+        Solve like solve, but move the vertices of out in place instead of
+        creating new ones.  out may also be previous.
+        """
+        assert len(out) == len(self.vertices)
+        self._solve(target, previous, tolerance, max_iterations)
+        for v, x, y in izip(out, self._xs, self._ys):
+            v.x = x
+            v.y = y
+        return out
+
+    def _solve(self, target, previous, tolerance, max_iterations):
+        # Solve into the scratch coordinates _xs and _ys, which are reused
+        # between calls.
+        n = len(self.vertices)
+        if n == 2:
+            self._solve_one_edge(target, self._xs, self._ys)
+        elif n == 3:
+            self._solve_two_edges(target, self._xs, self._ys)
+        elif n > 3:
+            if previous is None:
+                previous = self.vertices
+            else:
+                assert len(previous) == n
+            _fabrik_into(previous, self.vertices[0], self.lengths, target,
+                         tolerance, max_iterations, self._xs, self._ys)
+        else:
+            for i, v in enumerate(self.vertices):
+                self._xs[i] = v.x
+                self._ys[i] = v.y
+
+    def _solve_one_edge(self, target, xs, ys):
+        v1, v2 = self.vertices
+        xs[0] = v1.x
+        ys[0] = v1.y
+        ux = target.x - v1.x
+        uy = target.y - v1.y
+        d = sqrt(ux * ux + uy * uy)
+        if d == 0:
+            xs[1] = v2.x
+            ys[1] = v2.y
+        else:
+            s = self.lengths[0] / d
+            xs[1] = v1.x + s * ux
+            ys[1] = v1.y + s * uy
+
+    def _solve_two_edges(self, target, xs, ys):
+        v1, v2, v3 = self.vertices
+        d1, d2 = self.lengths
+        xs[0] = v1.x
+        ys[0] = v1.y
+        ux = target.x - v1.x
+        uy = target.y - v1.y
+        d = sqrt(ux * ux + uy * uy)
+        if d == 0:
+            s = d2 / d1
+            xs[1] = v2.x
+            ys[1] = v2.y
+            xs[2] = v2.x - s * (v2.x - v1.x)
+            ys[2] = v2.y - s * (v2.y - v1.y)
+            return
+        s1 = d1 / d
+        s2 = d2 / d
+        if d >= d1 + d2:
+            x2 = v1.x + s1 * ux
+            y2 = v1.y + s1 * uy
+            x3 = x2 + s2 * ux
+            y3 = y2 + s2 * uy
+        elif d <= d1 - d2:
+            x2 = v1.x + s1 * ux
+            y2 = v1.y + s1 * uy
+            x3 = x2 - s2 * ux
+            y3 = y2 - s2 * uy
+        elif d <= d2 - d1:
+            x2 = v1.x - s1 * ux
+            y2 = v1.y - s1 * uy
+            x3 = x2 + s2 * ux
+            y3 = y2 + s2 * uy
+        else:
+            # The middle vertex is at distance a along the target direction
+            # and h across it, on the side that keeps the rest winding.
+            a = (d * d + d1 * d1 - d2 * d2) / (2 * d)
+            h = sqrt(max(d1 * d1 - a * a, 0))
+            if not self.clockwise:
+                h = -h
+            ex = ux / d
+            ey = uy / d
+            x2 = v1.x + a * ex - h * ey
+            y2 = v1.y + a * ey + h * ex
+            x3 = target.x
+            y3 = target.y
+        xs[1] = x2
+        ys[1] = y2
+        xs[2] = x3
+        ys[2] = y3
+
+class SolveCache(object):
+    """
+    Memo of rig solutions.  Targets are rounded to a grid of the given
+    resolution, and the least recently used solutions are dropped beyond
+    max_size.
+    """
+
+    def __init__(self, resolution=1e-3, max_size=1024):
+        self.resolution = resolution
+        self._solutions = LRUCache(max_size)
+
+    def clear(self):
+        self._solutions.clear()
+
+    def _get_key(self, rig, target):
+        return (rig, rig.version, int(round(target.x / self.resolution)),
+                int(round(target.y / self.resolution)))
+
+    def _get_target(self, key):
+        return Point2(key[2] * self.resolution, key[3] * self.resolution)
+
+    def solve(self, rig, target):
+        """
+        Return the vertices of rig solved for target, rounded to the
+        resolution.
+        """
+        return self.solve_all([rig], [target])[0]
+
+    def solve_all(self, rigs, targets):
+        """
+        Solve each rig for its target.  The solutions that are not cached
+        are computed together with solve_rigs, from the rest poses.
+        """
+        keys = [self._get_key(rig, target)
+                for rig, target in zip(rigs, targets)]
+        solutions = [self._solutions.get(key) for key in keys]
+        misses = dict((key, None) for key, solution in zip(keys, solutions)
+                      if solution is None).keys()
+        if misses:
+            solved = {}
+            for key, vertices in zip(misses, _solve_rigs(
+                [key[0] for key in misses],
+                [self._get_target(key) for key in misses])):
+                # Stored as tuples, so that callers cannot change them.
+                solved[key] = tuple(tuple(v) for v in vertices)
+                self._solutions[key] = solved[key]
+            for i, key in enumerate(keys):
+                if solutions[i] is None:
+                    solutions[i] = solved[key]
+        return [tuple(Point2(x, y) for x, y in solution)
+                for solution in solutions]
+
+def solve_batch(chains, targets):
+    """
+    Solve each chain of vertices for its target, like solve, and return the
+    solved chains as tuples.  With numpy, all chains with the same number
+    of vertices are solved together.
+    """
+    chains = list(chains)
+    targets = list(targets)
+    assert len(chains) == len(targets)
+    if numpy is None:
+        return [tuple(solve(c, t)) for c, t in zip(chains, targets)]
+    results = [None] * len(chains)
+    for size, solve_arrays in ((2, _solve_one_edge_arrays),
+                               (3, _solve_two_edges_arrays)):
+        indices = [i for i, c in enumerate(chains) if len(c) == size]
+        if not indices:
+            continue
+        V = numpy.array([[tuple(v) for v in chains[i]] for i in indices],
+                        dtype=float)
+        T = numpy.array([tuple(targets[i]) for i in indices], dtype=float)
+        solved = solve_arrays(V, T).tolist()
+        for i, vertices in zip(indices, solved):
+            results[i] = tuple(Point2(x, y) for x, y in vertices)
+    for i, vertices in enumerate(results):
+        if vertices is None:
+            results[i] = tuple(solve(chains[i], targets[i]))
+    return results
+
+# Fewer rigs with the same number of edges are solved one by one, which is
+# faster than setting up numpy arrays for them.
+_min_batch_size = 48
+
+def solve_rigs(rigs, targets):
+    """
+    Solve each rig for its target, like LimbRig.solve from the rest pose,
+    and return the solved vertices as tuples.  With numpy, many rigs with the
+    same number of edges, up to two, are solved together from their stored
+    lengths and winding.
+    """
+    return [tuple(Point2(x, y) for x, y in vertices)
+            for vertices in _solve_rigs(rigs, targets)]
+
+def _solve_rigs(rigs, targets):
+    # As solve_rigs, but the vertices are (x, y) pairs.
+    rigs = list(rigs)
+    targets = list(targets)
+    assert len(rigs) == len(targets)
+    if numpy is None:
+        return [rig.solve(t) for rig, t in zip(rigs, targets)]
+    results = [None] * len(rigs)
+    for size, solve_arrays in ((2, _solve_one_edge_rigs),
+                               (3, _solve_two_edges_rigs)):
+        indices = [i for i, rig in enumerate(rigs)
+                   if len(rig.vertices) == size]
+        if len(indices) < _min_batch_size:
+            continue
+        R = numpy.array([rigs[i].row for i in indices], dtype=float)
+        T = numpy.array([(targets[i].x, targets[i].y) for i in indices],
+                        dtype=float)
+        solved = solve_arrays(R, T).tolist()
+        for i, vertices in zip(indices, solved):
+            results[i] = vertices
+    for i, vertices in enumerate(results):
+        if vertices is None:
+            results[i] = rigs[i].solve(targets[i])
+    return results
+
+def _solve_one_edge_rigs(R, T):
+    # Same as LimbRig._solve_one_edge, for rig rows R of shape (n, 5) and T
+    # of shape (n, 2).  Returns vertices of shape (n, 2, 2).
+    V = R[:, :4].reshape(-1, 2, 2)
+    v1 = V[:, 0]
+    u = T - v1
+    d = numpy.sqrt((u ** 2).sum(axis=1))
+    moved = d != 0
+    s = R[:, 4] / numpy.where(moved, d, 1)
+    result = V.copy()
+    result[moved, 1] = (v1 + u * s[:, numpy.newaxis])[moved]
+    return result
+
+def _solve_two_edges_rigs(R, T):
+    # Same cases as LimbRig._solve_two_edges, for rig rows R of shape (n, 9)
+    # and T of shape (n, 2).  Returns vertices of shape (n, 3, 2).
+    v1 = R[:, 0:2]
+    v2 = R[:, 2:4]
+    d1 = R[:, 6]
+    d2 = R[:, 7]
+    clockwise = R[:, 8] != 0
+    u = T - v1
+    d = numpy.sqrt((u ** 2).sum(axis=1))
+    zero = d == 0
+    safe_d = numpy.where(zero, 1, d)
+    safe_d1 = numpy.where(d1 == 0, 1, d1)
+    s1 = (d1 / safe_d)[:, numpy.newaxis]
+    s2 = (d2 / safe_d)[:, numpy.newaxis]
+    stretched = ~zero & (d >= d1 + d2)
+    folded1 = ~zero & ~stretched & (d <= d1 - d2)
+    folded2 = ~zero & ~stretched & ~folded1 & (d <= d2 - d1)
+
+    # The middle vertex is at distance a along the target direction and h
+    # across it, on the side that keeps the rest winding.
+    a = (d * d + d1 * d1 - d2 * d2) / (2 * safe_d)
+    h = numpy.sqrt(numpy.maximum(d1 * d1 - a * a, 0))
+    h = numpy.where(clockwise, h, -h)
+    ex = u[:, 0] / safe_d
+    ey = u[:, 1] / safe_d
+    bent_v2 = v1 + numpy.column_stack([a * ex - h * ey, a * ey + h * ex])
+
+    new_v2 = numpy.select(
+        [zero[:, numpy.newaxis], (stretched | folded1)[:, numpy.newaxis],
+         folded2[:, numpy.newaxis]],
+        [v2, v1 + u * s1, v1 - u * s1], bent_v2)
+    new_v3 = numpy.select(
+        [zero[:, numpy.newaxis], (stretched | folded2)[:, numpy.newaxis],
+         folded1[:, numpy.newaxis]],
+        [v2 - (v2 - v1) * (d2 / safe_d1)[:, numpy.newaxis],
+         new_v2 + u * s2, new_v2 - u * s2],
+        T)
+    return numpy.concatenate([v1[:, numpy.newaxis], new_v2[:, numpy.newaxis],
+                              new_v3[:, numpy.newaxis]], axis=1)
+
+def _solve_one_edge_arrays(V, T):
+    # V has shape (n, 2, 2) and T (n, 2).
+    v1 = V[:, 0]
+    u = T - v1
+    d = numpy.sqrt((u ** 2).sum(axis=1))
+    d1 = numpy.sqrt(((V[:, 1] - v1) ** 2).sum(axis=1))
+    moved = d != 0
+    scale = numpy.where(moved, d1 / numpy.where(moved, d, 1), 0)
+    result = V.copy()
+    result[moved, 1] = (v1 + u * scale[:, numpy.newaxis])[moved]
+    return result
+
+def _solve_two_edges_arrays(V, T):
+    # Same cases as solve_two_edges, for V of shape (n, 3, 2) and T (n, 2).
+    v1 = V[:, 0]
+    v2 = V[:, 1]
+    v3 = V[:, 2]
+    u = T - v1
+    u1 = v2 - v1
+    u2 = v3 - v2
+    d = numpy.sqrt((u ** 2).sum(axis=1))
+    d1 = numpy.sqrt((u1 ** 2).sum(axis=1))
+    d2 = numpy.sqrt((u2 ** 2).sum(axis=1))
+    zero = d == 0
+    safe_d = numpy.where(zero, 1, d)
+    safe_d1 = numpy.where(d1 == 0, 1, d1)
+    s1 = (d1 / safe_d)[:, numpy.newaxis]
+    s2 = (d2 / safe_d)[:, numpy.newaxis]
+    stretched = ~zero & (d >= d1 + d2)
+    folded1 = ~zero & ~stretched & (d <= d1 - d2)
+    folded2 = ~zero & ~stretched & ~folded1 & (d <= d2 - d1)
+    bent = ~zero & ~stretched & ~folded1 & ~folded2
+
+    # Closed form solution 2 from "Oh My God, I Inverted Kine!" by Jeff
+    # Lander, with the winding of the rest pose.
+    a1 = numpy.arctan2(u[:, 1], u[:, 0])
+    a2 = numpy.arccos(numpy.clip((d ** 2 + d1 ** 2 - d2 ** 2) /
+                                 (2 * safe_d1 * safe_d), -1, 1))
+    clockwise = u1[:, 0] * u2[:, 1] - u2[:, 0] * u1[:, 1] < 0
+    a = numpy.where(clockwise, a1 + a2, a1 - a2)
+
+    new_v2 = numpy.select(
+        [zero[:, numpy.newaxis], stretched[:, numpy.newaxis] |
+         folded1[:, numpy.newaxis], folded2[:, numpy.newaxis]],
+        [v2, v1 + u * s1, v1 - u * s1],
+        v1 + d1[:, numpy.newaxis] * numpy.column_stack([numpy.cos(a),
+                                                        numpy.sin(a)]))
+    new_v3 = numpy.select(
+        [zero[:, numpy.newaxis], (stretched | folded2)[:, numpy.newaxis],
+         folded1[:, numpy.newaxis]],
+        [v2 - u1 * (d2 / safe_d1)[:, numpy.newaxis],
+         new_v2 + u * s2, new_v2 - u * s2],
+        T)
+    return numpy.concatenate([v1[:, numpy.newaxis], new_v2[:, numpy.newaxis],
+                              new_v3[:, numpy.newaxis]], axis=1)
@@ -1,13 +1,18 @@
 from __future__ import division
 
+import array
 from Box2D import *
+from collections import deque
 from euclid import *
 from itertools import *
 from math import *
 import pyglet
 from pyglet.gl import *
 import sys
+import timeit
+import torn.cache
 from torn.geometry import *
+from torn.timestep import *
 
 def draw_polygon(vertices, closed=True):
     vertices = list(vertices)
@@ -17,6 +22,19 @@ def draw_polygon(vertices, closed=True):
     vertices = tuple(chain(*chain(*vertices)))
     pyglet.graphics.draw(len(vertices) // 2, GL_LINES, ('v2f', vertices))
 
+def draw_filled_polygons(polygons):
+    # Gather the cached triangles of all polygons into one shared vertex
+    # list, and draw them in a single call.
+    coords = array.array('d')
+    indices = array.array('I')
+    for polygon in polygons:
+        offset = len(coords) // 2
+        indices.extend(i + offset for i in polygon.triangle_indices)
+        coords.extend(polygon.coords)
+    if indices:
+        pyglet.graphics.draw_indexed(len(coords) // 2, GL_TRIANGLES, indices,
+                                     ('v2f', coords))
+
 def draw_circle(center, radius, vertex_count=100):
     x, y = center
     vertices = []
@@ -86,20 +104,37 @@ class Camera(object):
 
     angle = property(_get_angle, _set_angle)
 
+    def _get_world_to_screen(self):
+        if self._world_to_screen is None:
+            self._world_to_screen = Affine2.new_translate(*self._position)
+            self._world_to_screen.scale(self._scale, self._scale)
+            self._world_to_screen.rotate(radians(self._angle))
+        return self._world_to_screen
+
+    def _get_screen_to_world(self):
+        if self._screen_to_world is None:
+            self._screen_to_world = self._get_world_to_screen().inverse()
+        return self._screen_to_world
+
     def get_screen_point(self, world_point):
         assert isinstance(world_point, Point2)
-        screen_point = world_point * self.scale - self.position
-        return Point2(*screen_point)
+        return self._get_world_to_screen() * world_point
 
     def get_world_point(self, screen_point):
         assert isinstance(screen_point, Point2)
-        world_point = (screen_point - self.position) / self.scale
-        return Point2(*world_point)
+        return self._get_screen_to_world() * screen_point
+
+    def get_screen_points(self, world_points, screen_points=None):
+        return self._get_world_to_screen().transform_points(world_points,
+                                                            screen_points)
+
+    def get_world_points(self, screen_points, world_points=None):
+        return self._get_screen_to_world().transform_points(screen_points,
+                                                            world_points)
 
     def transform_view(self):
-        glTranslatef(self._position.x, self._position.y, 0)
-        glScalef(self._scale, self._scale, self._scale)
-        glRotatef(self._angle, 0, 0, 1)
+        matrix = self._get_world_to_screen().get_gl_matrix()
+        glMultMatrixf((GLfloat * 16)(*matrix))
 
 class CameraController(object):
     def __init__(self, camera, pan_step=20, zoom_step=1.2):
@@ -129,16 +164,52 @@ class Level(Model):
         self.polygons = []
         
 class Game(object):
-    def __init__(self, level):
+    def __init__(self, level, scheduled=True):
         self.world = self._create_world()
+        # Body, polygon in body coordinates, and the buffers used to draw
+        # it.  Bodies are also looked up by polygon.
+        self._pieces = []
+        self._bodies = {}
+        self._fill_indices = None
+        # Queued tears as polygons and cuts in body coordinates, the tear in
+        # progress, and the pieces of polygons torn since the queue was
+        # last empty.
+        self._tears = deque()
+        self._tearing = None
+        self._torn = {}
+        # Seconds per step that may be spent on tearing.
+        self.tear_budget = 0.002
+        # Distance from a body within which joints attach to it.
+        self.joint_epsilon = 0.05
+        # The world is stepped at a fixed rate, at most max_steps times per
+        # call to step, and drawn between the last two steps.
+        self.clock = FixedTimeStep(1 / 60, max_steps=5)
+        self._previous_states = {}
+        # Bodies use the level polygons as they are.  Their triangles and
+        # decompositions stay cached on them for the next game, and are
+        # shared with identical polygons, e.g. from an earlier session.  Box2D
+        # cannot handle self-intersecting polygons.
+        polygons = []
         for polygon in level.polygons:
-            if len(polygon.vertices) >= 3:
-                self._create_body(polygon)
+            if len(polygon.coords) >= 6 and polygon.closed:
+                polygon.shared = True
+                if polygon.simple:
+                    polygons.append(polygon)
+        # Bodies still have their level coordinates, so joints can be
+        # matched against the level polygons.
+        grid = HashGrid(1)
+        for polygon, mass in izip(polygons, mass_properties(polygons)):
+            body = self._create_body(polygon, mass=mass)
+            grid.insert(body, polygon.bounds)
         for polygon in level.polygons:
-            if len(polygon.vertices) <= 2:
+            if len(polygon.coords) <= 4:
                 for vertex in polygon.vertices:
-                    self._create_joint(vertex)
-        pyglet.clock.schedule_interval(self.step, 1 / 60)
+                    self._create_joint(vertex, grid)
+        # Without scheduling, the owner calls step, e.g. when running
+        # headless.
+        self.scheduled = scheduled
+        if scheduled:
+            pyglet.clock.schedule(self.step)
 
     def _create_world(self):
         aabb = b2AABB()
@@ -146,51 +217,246 @@ class Game(object):
         aabb.upperBound = 100, 100
         return b2World(aabb, (0, -10), True)
 
-    def _create_body(self, polygon):
+    def _create_body(self, polygon, position=(0, 0), angle=0, mass=None):
         body_def = b2BodyDef()
+        body_def.position = position
+        body_def.angle = angle
         body = self.world.CreateBody(body_def)
-        shape_def = b2PolygonDef()
-        if polygon.clockwise:
-            polygon = polygon.copy()
-            polygon.reverse()
-        shape_def.vertices = [tuple(v) for v in polygon.vertices]
-        shape_def.density = 1
-        body.CreateShape(shape_def)
-        body.SetMassFromShapes()
+        # Box2D only accepts convex polygons with at most 8 vertices.
+        for piece in polygon.convex_decomposition(8):
+            shape_def = b2PolygonDef()
+            shape_def.vertices = list(piece)
+            shape_def.density = 1
+            body.CreateShape(shape_def)
+        if mass is None:
+            body.SetMassFromShapes()
+        else:
+            # Mass, center and inertia as returned by mass_properties.
+            mass_data = b2MassData()
+            mass_data.mass, mass_data.center, mass_data.I = mass
+            body.SetMass(mass_data)
+        body.userData = polygon
+        self._bodies[polygon] = body
+        self._pieces.append((body, polygon, array.array('d', polygon.segments),
+                             array.array('d', polygon.coords)))
+        self._fill_indices = None
         return body
 
-    def _create_joint(self, point):
+    def _destroy_body(self, body):
+        polygon = body.userData
+        del self._bodies[polygon]
+        self._pieces = [piece for piece in self._pieces
+                        if piece[1] is not polygon]
+        self._fill_indices = None
+        self.world.DestroyBody(body)
+
+    def _get_fill_indices(self):
+        # The triangles of all bodies share one index buffer, rebuilt when
+        # bodies are added or removed.
+        if self._fill_indices is None:
+            self._fill_indices = array.array('I')
+            offset = 0
+            for _, polygon, _, _ in self._pieces:
+                self._fill_indices.extend(i + offset
+                                          for i in polygon.triangle_indices)
+                offset += len(polygon.coords) // 2
+        return self._fill_indices
+
+    def tear(self, line):
+        """
+        Queue a cut along the line segment, in world coordinates, through
+        all bodies it touches.  The bodies are torn in later steps.
+        """
+        assert isinstance(line, LineSegment2)
+        p1 = line.p
+        p2 = line.p + line.v
         aabb = b2AABB()
-        aabb.lowerBound = tuple(point)
-        aabb.upperBound = tuple(point)
+        aabb.lowerBound = min(p1.x, p2.x), min(p1.y, p2.y)
+        aabb.upperBound = max(p1.x, p2.x), max(p1.y, p2.y)
         _, shapes = self.world.Query(aabb, 1000)
-        bodies = [s.GetBody() for s in shapes]
+        for body in self._get_bodies(shapes):
+            to_local = self._get_transform(body).inverse()
+            local_p1 = to_local * p1
+            local_p2 = to_local * p2
+            if local_p1 != local_p2:
+                self._tears.append((body.userData,
+                                    LineSegment2(local_p1, local_p2)))
+
+    def _get_bodies(self, shapes):
+        # A body can have several shapes.  Tell bodies apart by their
+        # polygons, since Box2D may wrap the same body twice.
+        bodies = []
+        polygons = set()
+        for shape in shapes:
+            body = shape.GetBody()
+            if id(body.userData) not in polygons:
+                polygons.add(id(body.userData))
+                bodies.append(body)
+        return bodies
+
+    def _tear_stages(self, polygon, line):
+        # Tear the body of polygon along line, in body coordinates.  Yields
+        # after each expensive stage, so that the work can be spread over
+        # several steps.  The body is replaced in the last stage.
+        pieces = polygon.split(line)
+        if len(pieces) < 2:
+            return
+        for piece in pieces:
+            yield
+            if not piece.simple:
+                # Box2D cannot handle the piece.  Keep the body whole rather
+                # than lose part of it.
+                return
+        for piece in pieces:
+            yield
+            piece.triangle_indices
+            yield
+            piece.convex_decomposition(8)
+        yield
+        masses = mass_properties(pieces)
+        body = self._bodies[polygon]
+        position = body.position.tuple()
+        angle = body.angle
+        center = body.GetWorldCenter()
+        velocity = body.GetLinearVelocity()
+        angular_velocity = body.GetAngularVelocity()
+        joints = self._get_joints(body)
+        self._destroy_body(body)
+        piece_bodies = []
+        for piece, mass in izip(pieces, masses):
+            piece_body = self._create_body(piece, position, angle, mass)
+            piece_bodies.append(piece_body)
+
+            # Keep the velocity that the center of the piece had before.
+            piece_center = piece_body.GetWorldCenter()
+            rx = piece_center.x - center.x
+            ry = piece_center.y - center.y
+            piece_body.SetLinearVelocity((velocity.x - angular_velocity * ry,
+                                          velocity.y + angular_velocity * rx))
+            piece_body.SetAngularVelocity(angular_velocity)
+
+        # Box2D destroys the joints with the body.  Attach them again to the
+        # pieces at their anchors, all of them if the cut runs through one.
+        for other, anchor in joints:
+            for piece_body in self._get_anchored_bodies(anchor, piece_bodies):
+                self._join(piece_body, other, anchor)
+        self._torn[polygon] = pieces
+
+    def _get_joints(self, body):
+        # The other body and the world anchor of each joint on body.
+        polygon = body.userData
+        joints = []
+        for joint in self.world.jointList:
+            if joint.GetBody1().userData is polygon:
+                joints.append((joint.GetBody2(),
+                               Point2(*joint.GetAnchor1().tuple())))
+            elif joint.GetBody2().userData is polygon:
+                joints.append((joint.GetBody1(),
+                               Point2(*joint.GetAnchor2().tuple())))
+        return joints
+
+    def _process_tears(self):
+        # Tear in stages until the time budget is spent, and resume in the
+        # next step.  The budget is a few milliseconds, so use the most
+        # precise clock.
+        deadline = timeit.default_timer() + self.tear_budget
+        while timeit.default_timer() < deadline:
+            if self._tearing is None:
+                if not self._tears:
+                    self._torn.clear()
+                    return
+                polygon, line = self._tears.popleft()
+                if polygon not in self._bodies:
+                    # Torn since the tear was queued.  Pieces share the body
+                    # coordinates of the polygon, so cut them instead.
+                    pieces = self._torn.get(polygon, ())
+                    self._tears.extendleft((piece, line)
+                                           for piece in reversed(pieces))
+                    continue
+                self._tearing = self._tear_stages(polygon, line)
+            try:
+                self._tearing.next()
+            except StopIteration:
+                self._tearing = None
+
+    def _create_joint(self, point, grid):
+        epsilon = self.joint_epsilon
+        candidates = grid.query((point.x - epsilon, point.y - epsilon,
+                                 point.x + epsilon, point.y + epsilon))
+        bodies = self._get_anchored_bodies(point, candidates)
         if len(bodies) == 1:
-            joint_def = b2RevoluteJointDef()
-            joint_def.Initialize(bodies[0], self.world.GetGroundBody(),
-                                 tuple(point))
-            self.world.CreateJoint(joint_def)
+            self._join(bodies[0], self.world.GetGroundBody(), point)
         elif len(bodies) == 2:
-            joint_def = b2RevoluteJointDef()
-            joint_def.Initialize(bodies[0], bodies[1], tuple(point))
-            self.world.CreateJoint(joint_def)
+            self._join(bodies[0], bodies[1], point)
+
+    def _get_anchored_bodies(self, point, bodies):
+        # The bodies that contain point, in world coordinates, or are within
+        # joint_epsilon of it.
+        anchored = []
+        for body in bodies:
+            polygon = body.userData
+            local_point = self._get_transform(body).inverse() * point
+            if polygon.intersect(local_point) or \
+               nearest_segment2(local_point, polygon.segments,
+                                self.joint_epsilon) is not None:
+                anchored.append(body)
+        return anchored
+
+    def _join(self, body1, body2, point):
+        joint_def = b2RevoluteJointDef()
+        joint_def.Initialize(body1, body2, tuple(point))
+        self.world.CreateJoint(joint_def)
 
     def delete(self):
-        pyglet.clock.unschedule(self.step)
+        if self.scheduled:
+            pyglet.clock.unschedule(self.step)
 
     def step(self, dt):
-        self.world.Step(dt, 10, 10)
+        self._process_tears()
+        for _ in xrange(self.clock.advance(dt)):
+            self._save_states()
+            self.world.Step(self.clock.time_step, 10, 10)
+
+    def _save_states(self):
+        self._previous_states = dict((polygon, (body.position.x,
+                                                body.position.y,
+                                                body.angle))
+                                     for body, polygon, _, _ in self._pieces)
+
+    def _get_transform(self, body):
+        transform = Affine2.new_translate(body.position.x, body.position.y)
+        return transform.rotate(body.angle)
+
+    def _get_draw_transform(self, body, polygon):
+        # Interpolate between the last two steps, by the time left over in
+        # the accumulator.
+        state = self._previous_states.get(polygon)
+        if state is None:
+            return self._get_transform(body)
+        x, y, angle = self.clock.interpolate(
+            state, (body.position.x, body.position.y, body.angle))
+        return Affine2.new_translate(x, y).rotate(angle)
 
     def draw(self):
-        for body in self.world.bodyList:
-            glPushMatrix()
-            glTranslatef(body.position.x, body.position.y, 0)
-            angle = body.angle * 180 / pi
-            glRotatef(angle, 0, 0, 1)
-            for shape in body.shapeList:
-                if isinstance(shape, b2PolygonShape):
-                    draw_polygon(shape.vertices)
-            glPopMatrix()
+        # Transform the fills and outlines of all bodies on the CPU, one
+        # matrix per body, and draw each in a single call.
+        coords = array.array('d')
+        vertices = array.array('d')
+        for body, polygon, world_lines, world_coords in self._pieces:
+            transform = self._get_draw_transform(body, polygon)
+            transform.transform_points(polygon.segments, world_lines)
+            transform.transform_points(polygon.coords, world_coords)
+            coords.extend(world_coords)
+            vertices.extend(world_lines)
+        fill_indices = self._get_fill_indices()
+        if fill_indices:
+            glColor3f(0.3, 0.3, 0.3)
+            pyglet.graphics.draw_indexed(len(coords) // 2, GL_TRIANGLES,
+                                         fill_indices, ('v2f', coords))
+            glColor3f(1, 1, 1)
+        if vertices:
+            pyglet.graphics.draw(len(vertices) // 2, GL_LINES,
+                                 ('v2f', vertices))
         for joint in self.world.jointList:
             draw_circle(joint.GetAnchor1().tuple(), 0.05)
             draw_circle(joint.GetAnchor2().tuple(), 0.05)
@@ -207,6 +473,7 @@ class GameLayer(Layer):
                              scale=(min(window.width, window.height) / 5))
         self.camera_controller = CameraController(self.camera)
         self.game = None
+        self.tear_start = None
 
     def draw(self):
         glPushMatrix()
@@ -226,6 +493,21 @@ class GameLayer(Layer):
         else:
             return self.camera_controller.on_key_press(symbol, modifiers)
 
+    def on_mouse_press(self, x, y, button, modifiers):
+        if self.game is None:
+            return pyglet.event.EVENT_UNHANDLED
+        self.tear_start = self.camera.get_world_point(Point2(x, y))
+        return pyglet.event.EVENT_HANDLED
+
+    def on_mouse_release(self, x, y, button, modifiers):
+        if self.game is None or self.tear_start is None:
+            return pyglet.event.EVENT_UNHANDLED
+        tear_end = self.camera.get_world_point(Point2(x, y))
+        if tear_end != self.tear_start:
+            self.game.tear(LineSegment2(self.tear_start, tear_end))
+        self.tear_start = None
+        return pyglet.event.EVENT_HANDLED
+
 class EditSkeletonLayer(Layer):
     def __init__(self, window, game_layer):
         self.window = window
@@ -239,13 +521,43 @@ class EditSkeletonLayer(Layer):
             return
         glPushMatrix()
         self.camera.transform_view()
+
+        # Dragged polygons change on every mouse event, so they are drawn
+        # as they are, and filled again when released.  Draw the other
+        # outlines with no more detail than half a pixel.
+        dragged = self._get_dragged_polygons()
+        tolerance = 0.5 / self.camera.scale
+        outlines = []
         for polygon in self.level.polygons:
-            draw_polygon(polygon.vertices, polygon.closed)
-            for vertex in polygon.vertices:
-                draw_circle(vertex, self.mouse_radius / self.camera.scale)
+            if polygon not in dragged:
+                polygon = polygon.get_level_of_detail(tolerance)
+            outlines.append(polygon)
+        glColor3f(0.3, 0.3, 0.3)
+        draw_filled_polygons(outline for polygon, outline
+                             in izip(self.level.polygons, outlines)
+                             if polygon not in dragged and outline.simple)
+        glColor3f(1, 1, 1)
+        # Draw from the flat arrays rather than from vertices, so that the
+        # level polygons do not keep lists of Point2.
+        lines = array.array('d')
+        for outline in outlines:
+            lines.extend(outline.segments)
+        if lines:
+            pyglet.graphics.draw(len(lines) // 2, GL_LINES, ('v2f', lines))
+        radius = self.mouse_radius / self.camera.scale
+        for polygon in self.level.polygons:
+            coords = polygon.coords
+            for i in xrange(0, len(coords), 2):
+                draw_circle((coords[i], coords[i + 1]), radius)
         glPopMatrix()
 
+    def _get_dragged_polygons(self):
+        return [layer.polygon for layer in self.window.layers
+                if isinstance(layer, DragPolygonLayer)]
+
     def on_mouse_press(self, x, y, button, modifiers):
+        if self.game_layer.game is not None:
+            return pyglet.event.EVENT_UNHANDLED
         mouse_point = self.camera.get_world_point(Point2(x, y))
         mouse_circle = Circle(mouse_point, self.mouse_radius / self.camera.scale)
         handled = self._drag_point(mouse_circle)
@@ -254,48 +566,78 @@ class EditSkeletonLayer(Layer):
         if not handled:
             polygon = Polygon([mouse_point, mouse_point])
             self.level.polygons.append(polygon)
-            DragPolygonLayer(self.window, self.camera, polygon,
-                             polygon.vertices[-1])
+            self._drag_vertex(polygon, polygon.vertices[-1])
         return pyglet.event.EVENT_HANDLED
 
     def _drag_point(self, mouse_circle):
         for polygon in self.level.polygons:
-            for vertex in polygon.vertices:
-                if mouse_circle.intersect(vertex):
-                    DragPolygonLayer(self.window, self.camera, polygon, vertex)
-                    return pyglet.event.EVENT_HANDLED
+            indices = points_in_circle2(mouse_circle, polygon.coords)
+            if indices:
+                vertex = polygon.vertices[indices[0]]
+                self._drag_vertex(polygon, vertex)
+                return pyglet.event.EVENT_HANDLED
         return pyglet.event.EVENT_UNHANDLED
 
     def _drag_line(self, mouse_circle):
         for polygon in self.level.polygons:
-            for i, edge in enumerate(polygon.edges):
-                v1, v2 = edge
+            segments = polygon.segments
+            nearest = nearest_segment2(mouse_circle.c, segments,
+                                       mouse_circle.r)
+            if nearest is not None:
+                i, _ = nearest
+                x1, y1, x2, y2 = segments[4 * i:4 * i + 4]
+                v1 = Point2(x1, y1)
+                v2 = Point2(x2, y2)
                 if v1 == v2:
-                    connection = mouse_circle.c.connect(v1)
+                    vertex = v1.copy()
                 else:
                     connection = mouse_circle.c.connect(LineSegment2(v1, v2))
-                if connection.length < mouse_circle.r:
                     vertex = connection.p2.copy()
-                    polygon.vertices[i + 1:i + 1] = [vertex]
-                    DragPolygonLayer(self.window, self.camera, polygon, vertex)
-                    return pyglet.event.EVENT_HANDLED
+                polygon.vertices[i + 1:i + 1] = [vertex]
+                self._drag_vertex(polygon, vertex)
+                return pyglet.event.EVENT_HANDLED
         return pyglet.event.EVENT_UNHANDLED
 
+    def _drag_vertex(self, polygon, vertex):
+        # Snap to the vertices of the other polygons in the level.
+        snap_radius = self.mouse_radius / self.camera.scale
+        snap_grid = HashGrid(snap_radius)
+        others = [p for p in self.level.polygons if p is not polygon]
+        for other in others:
+            coords = other.coords
+            for i in xrange(0, len(coords), 2):
+                x = coords[i]
+                y = coords[i + 1]
+                snap_grid.insert(Point2(x, y), (x, y, x, y))
+        DragPolygonLayer(self.window, self.camera, polygon, vertex,
+                         snap_grid, snap_radius, others)
+
 class DragPolygonLayer(Layer):
-    def __init__(self, window, camera, polygon, vertex):
+    def __init__(self, window, camera, polygon, vertex, snap_grid=None,
+                 snap_radius=0, others=()):
         self.window = window
         self.camera = camera
         self.polygon = polygon
         self.vertex = vertex
+        self.snap_grid = snap_grid
+        self.snap_radius = snap_radius
+        self.others = others
         self.window.push_layer(self)
 
     def on_mouse_drag(self, x, y, dx, dy, button, modifiers):
-        self.vertex[:] = self.camera.get_world_point(Point2(x, y))
+        point = self.camera.get_world_point(Point2(x, y))
+        if self.snap_grid is not None:
+            nearest = self.snap_grid.query_point(point, self.snap_radius)
+            if nearest:
+                point = nearest[0]
+        self.vertex[:] = point
+        self.polygon.update()
         return pyglet.event.EVENT_HANDLED
 
     def on_mouse_release(self, x, y, button, modifiers):
-        self.polygon.vertices = list(k for k, _
-                                     in groupby(self.polygon.vertices))
+        # Merge vertices within a pixel of each other or of the other
+        # polygons.
+        weld_vertices([self.polygon], 1 / self.camera.scale, self.others)
         self.window.pop_layer(self)
         return pyglet.event.EVENT_HANDLED
 
@@ -311,10 +653,14 @@ class TornWindow(pyglet.window.Window):
         self.push_handlers(layer)
 
     def pop_layer(self, layer):
+        # Pop layer and the layers above it, and stop their event handlers,
+        # which would otherwise keep handling events.
         if layer in self.layers:
-            while self.layers[-1] is not layer:
-                self.layers.pop()
-            self.layers.pop()
+            while True:
+                popped = self.layers.pop()
+                self.remove_handlers(popped)
+                if popped is layer:
+                    break
 
     def on_draw(self):
         self.clear()
@@ -327,12 +673,18 @@ class TornWindow(pyglet.window.Window):
 def main():
     fps = '--fps' in sys.argv
     fullscreen = '--windowed' not in sys.argv
+    # Keep triangulations and decompositions between sessions.
+    cache_path = '--cache' in sys.argv and 'torn-cache.pickle' or None
+    if cache_path:
+        torn.cache.cache.load(cache_path)
     window = TornWindow(fps=fps, fullscreen=fullscreen)
     level = Level()
     level.polygons.append(Polygon([Point2(), Point2(1, 1), Point2(1, 0)]))
     window.push_layer(GameLayer(window, level))
     window.push_layer(EditSkeletonLayer(window, window.layers[-1]))
     pyglet.app.run()
+    if cache_path:
+        torn.cache.cache.save(cache_path)
 
 if __name__ == '__main__':
     main()
@@ -1,5 +1,6 @@
 from __future__ import division
 
+import array
 from Box2D import *
 import copy
 from euclid import *
@@ -224,8 +225,7 @@ class SkeletonEditor(Screen):
         epsilon = self.screen_epsilon / self.camera.scale
 
         # First option, drag an existing vertex.
-        vertices = filter(Circle(point, epsilon).intersect,
-                          self.skeleton.vertices)
+        vertices = self.get_skeleton_vertices(Circle(point, epsilon))
         if vertices:
             self.drag_vertex = random.choice(vertices)
 
@@ -239,25 +239,33 @@ class SkeletonEditor(Screen):
             self.drag_vertex = limb.vertices[-1]
             self.skeleton.limbs.append(limb)
 
+    def get_skeleton_vertices(self, circle):
+        vertices = self.skeleton.vertices
+        points = array.array('d', chain(*vertices))
+        return [vertices[i] for i in points_in_circle2(circle, points)]
+
     def drag_edge(self, point, epsilon):
         assert isinstance(point, Point2)
         for polygon in self.skeleton.polygons:
-            for i, edge in enumerate(polygon.edges):
-                v1, v2 = edge
+            segments = polygon.segments
+            nearest = nearest_segment2(point, segments, epsilon)
+            if nearest is not None:
+                i, _ = nearest
+                x1, y1, x2, y2 = segments[4 * i:4 * i + 4]
+                v1 = Point2(x1, y1)
+                v2 = Point2(x2, y2)
                 if v1 == v2:
-                    connection = point.connect(v1)
+                    vertex = v1.copy()
                 else:
-                    connection = point.connect(LineSegment2(v1, v2))
-                if connection.length < epsilon:
-                    vertex = connection.p2.copy()
-                    polygon.vertices[i + 1:i + 1] = [vertex]
-                    return vertex
+                    vertex = point.connect(LineSegment2(v1, v2)).p2.copy()
+                polygon.vertices[i + 1:i + 1] = [vertex]
+                return vertex
         return None
 
     def on_mouse_release(self, x, y, button, modifiers):
         epsilon = 2 * self.screen_epsilon / self.camera.scale
-        vertices = filter(Circle(self.drag_vertex, epsilon).intersect,
-                          self.skeleton.vertices)
+        vertices = self.get_skeleton_vertices(Circle(self.drag_vertex,
+                                                     epsilon))
         if len(vertices) >= 2:
             self.delete_skeleton_vertex(self.drag_vertex)
 
@@ -271,6 +279,8 @@ class SkeletonEditor(Screen):
 
     def on_mouse_drag(self, x, y, dx, dy, buttons, modifiers):
         self.drag_vertex[:] = self.camera.get_world_point(Point2(x, y))
+        for polygon in self.skeleton.polygons:
+            polygon.update()
 
     def on_key_press(self, symbol, modifiers):
         if symbol == pyglet.window.key.BACKSPACE:
@@ -444,6 +454,16 @@ class Pose(object):
         assert isinstance(skeleton, Skeleton)
         self.targets = [l.vertices[-1].copy() for l in skeleton.limbs]
 
+    def __getstate__(self):
+        return array.array('d', chain(*self.targets))
+
+    def __setstate__(self, state):
+        if isinstance(state, dict):
+            self.__dict__.update(state)
+        else:
+            self.targets = [Point2(state[i], state[i + 1])
+                            for i in xrange(0, len(state), 2)]
+
 class Animation(object):
     def __init__(self, skeleton, looped=True):
         assert isinstance(skeleton, Skeleton)
@@ -465,18 +485,18 @@ class AnimationEditor(Screen):
             self.animation = Animation(self.skeleton)
         self.pose_index = 0
         self.history = []
+        self.rigs = [ik.LimbRig(l.vertices) for l in self.skeleton.limbs]
+        self.solve_cache = ik.SolveCache()
         self.drag_limbs = self.get_drag_limbs()
         self.limb_index = None
         self.pan_step = 20
         self.zoom_step = 1.2
 
     def get_drag_limbs(self):
-        limbs = []
+        # Flipping through poses solves the same targets again and again.
         pose = self.animation.poses[self.pose_index]
-        for i, limb in enumerate(self.skeleton.limbs):
-            vertices = ik.solve(limb.vertices, pose.targets[i])
-            limbs.append(Polygon(vertices, closed=False))
-        return limbs
+        chains = self.solve_cache.solve_all(self.rigs, pose.targets)
+        return [Polygon(vertices, closed=False) for vertices in chains]
 
     def on_close(self):
         save_object(self.animation, 'torn-animation.pickle')
@@ -529,9 +549,12 @@ class AnimationEditor(Screen):
         if self.limb_index is None:
             return
         mouse_point = self.camera.get_world_point(Point2(x, y))
-        limb = self.skeleton.limbs[self.limb_index]
-        vertices = ik.solve(limb.vertices, mouse_point)
-        self.drag_limbs[self.limb_index] = Polygon(vertices, closed=False)
+        # Long limbs are solved iteratively, starting from the last drag.
+        limb = self.drag_limbs[self.limb_index]
+        vertices = self.rigs[self.limb_index].solve_into(mouse_point,
+                                                         limb.vertices,
+                                                         limb.vertices)
+        limb.update()
         pose = self.animation.poses[self.pose_index]
         pose.targets[self.limb_index] = vertices[-1].copy()
 
@@ -0,0 +1,51 @@
+"""
+Fixed rate stepping for a variable frame rate.
+
+Elapsed time is added to an accumulator, and whole steps are taken from it.
+The time left over is a fraction of a step, used to interpolate between the
+states before and after the last step when drawing.
+"""
+
+from __future__ import division
+
+__all__ = ['FixedTimeStep']
+
+class FixedTimeStep(object):
+    """
+    Accumulator for stepping at a fixed rate.  At most max_steps steps are
+    taken per call to advance, and time that could not be caught up with is
+    dropped.
+    """
+
+    def __init__(self, time_step=1 / 60, max_steps=5):
+        self.time_step = time_step
+        self.max_steps = max_steps
+        self.accumulator = 0
+
+    def advance(self, dt):
+        """
+        Add dt seconds and return the number of steps to take.
+        """
+        self.accumulator += dt
+        steps = 0
+        while self.accumulator >= self.time_step and steps < self.max_steps:
+            self.accumulator -= self.time_step
+            steps += 1
+        # Give up on time that could not be caught up with.
+        self.accumulator = min(self.accumulator, self.time_step)
+        return steps
+
+    @property
+    def alpha(self):
+        """
+        The fraction of a step left over, from 0 to 1.
+        """
+        return self.accumulator / self.time_step
+
+    def interpolate(self, previous, current):
+        """
+        Interpolate between tuples of numbers, from the state before the
+        last step to the current state, by alpha.
+        """
+        alpha = self.alpha
+        return tuple(a + alpha * (b - a) for a, b in zip(previous, current))